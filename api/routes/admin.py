@@ -1,25 +1,109 @@
-from fastapi import APIRouter, Depends, HTTPException, Form, File, UploadFile
+from fastapi import APIRouter, Depends, HTTPException, Form, File, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
+from functools import partial
 from typing import Optional
-from core.database import get_db
-from services.auth import get_current_admin_user
-from services.business import ProductService
-from models.schemas import User, ProductCreate, ProductResponse
-from core.utils import save_uploaded_image
+from datetime import datetime
+from core.database import SessionLocal, get_async_db, get_db
+from core.exporters import EXPORT_FORMATS, iter_export
+from core.importers import IMPORT_FORMATS, import_format
+from services.auth import get_current_admin_user, principal_cache
+from services.business import AsyncProductService, ProductService, PRODUCT_COLUMNS, page_cache, product_fragments
+from models.schemas import User, ProductCreate, AdminProductResponse, ProductImportReport
+from core.images import image_pipeline, variant_url
 
 router = APIRouter()
 
 @router.get("/products")
 async def admin_get_products(
+    after_id: int = Query(0, ge=0, description="Pass the last id of the previous page for the next one"),
+    limit: int = Query(100, ge=1, le=1000),
     current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Page through every product, inactive ones included, in id order.
+    
+    A page shorter than limit is the last. For the whole catalog in one
+    response use /products/export, which streams it.
+    """
+    product_service = AsyncProductService(db)
+    return await product_service.list_all_products(after_id=after_id, limit=limit)
+
+@router.get("/products/export")
+async def admin_export_products(
+    format: str = Query("ndjson", description="ndjson or csv"),
+    columns: Optional[str] = Query(None, description="Comma-separated column names; all columns when omitted"),
+    updated_since: Optional[datetime] = Query(None),
+    current_user: User = Depends(get_current_admin_user)
+):
+    """Stream the full catalog, inactive products included"""
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Format must be one of: {', '.join(EXPORT_FORMATS)}")
+    selected = [name.strip() for name in columns.split(",") if name.strip()] if columns else list(PRODUCT_COLUMNS)
+    unknown = [name for name in selected if name not in PRODUCT_COLUMNS]
+    if unknown or not selected:
+        raise HTTPException(status_code=400, detail=f"Unknown columns: {', '.join(unknown)}" if unknown else "No columns selected")
+    
+    def stream():
+        # The request's dependencies are torn down before the body streams, so
+        # the export owns its session for as long as the client keeps reading
+        with SessionLocal() as db:
+            batches = ProductService(db).export_products(selected, updated_since)
+            yield from iter_export(format, selected, batches)
+    
+    filename = f"products.{'csv' if format == 'csv' else 'ndjson'}"
+    return StreamingResponse(
+        stream(),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@router.get("/cache/stats")
+async def admin_cache_stats(
+    current_user: User = Depends(get_current_admin_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Cache hit/miss counters"""
+    product_service = AsyncProductService(db)
+    return {
+        "catalog": product_service.cache_stats(),
+        "pages": page_cache.stats(),
+        "product_fragments": product_fragments.stats(),
+        "principals": principal_cache.stats()
+    }
+
+@router.get("/images/{digest}")
+async def admin_image_status(
+    digest: str,
+    current_user: User = Depends(get_current_admin_user)
 ):
-    """Get all products for admin"""
-    product_service = ProductService(db)
-    products, _ = product_service.get_products_paginated(page=1, per_page=100)
-    return products
+    """Processing status of each variant of an uploaded image"""
+    return {"digest": digest, "variants": image_pipeline.status(digest)}
 
-@router.post("/products", response_model=ProductResponse)
+async def _queue_image(image: Optional[UploadFile], product_id: int) -> Optional[str]:
+    """Hand an upload to the image pipeline, pointing the product at it once processed; returns its content digest"""
+    if not image or not image.filename:
+        return None
+    data = await image.read()
+    # Validation parses the image header, and an already-processed image is linked straight away
+    return await run_in_threadpool(image_pipeline.submit, data, image.filename, partial(_use_image, product_id))
+
+def _use_image(product_id: int, digest: str):
+    """Point a product at its image's variants, which now exist"""
+    with SessionLocal() as db:
+        ProductService(db).update_product(product_id, {"image_url": variant_url(digest)})
+
+def _admin_product_response(product, image_digest: Optional[str]) -> AdminProductResponse:
+    response = AdminProductResponse.model_validate(product)
+    if image_digest:
+        response.image_status = image_pipeline.status(image_digest)
+        if all(status == "ready" for status in response.image_status.values()):
+            response.image_url = variant_url(image_digest)
+    return response
+
+@router.post("/products", response_model=AdminProductResponse)
 async def admin_create_product(
     name: str = Form(...),
     description: str = Form(""),
@@ -31,17 +115,10 @@ async def admin_create_product(
     is_featured: bool = Form(False),
     image: Optional[UploadFile] = File(None),
     current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create new product"""
-    product_service = ProductService(db)
-    
-    # Handle image upload
-    image_url = None
-    if image:
-        filename = save_uploaded_image(image)
-        if filename:
-            image_url = f"/static/images/products/{filename}"
+    product_service = AsyncProductService(db)
     
     product_data = ProductCreate(
         name=name,
@@ -54,16 +131,26 @@ async def admin_create_product(
         is_featured=is_featured
     )
     
-    product = product_service.create_product(product_data)
-    
-    # Update image URL if uploaded
-    if image_url:
-        product_service.update_product(product.id, {"image_url": image_url})
-        product.image_url = image_url
-    
-    return product
+    product = await product_service.create_product(product_data)
+    # Variants are produced in the background; the product links them once they exist
+    image_digest = await _queue_image(image, product.id)
+    return _admin_product_response(product, image_digest)
 
-@router.put("/products/{product_id}")
+@router.post("/products/import", response_model=ProductImportReport)
+async def admin_import_products(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, description="csv or ndjson; inferred from the filename when omitted"),
+    current_user: User = Depends(get_current_admin_user),
+    db: Session = Depends(get_db)
+):
+    """Bulk import products from a CSV or NDJSON upload, upserting on SKU"""
+    fmt = format or import_format(file.filename)
+    if fmt not in IMPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Upload must be one of: {', '.join(IMPORT_FORMATS)}")
+    # Parsing and validation are CPU-bound; keep them off the event loop
+    return await run_in_threadpool(ProductService(db).import_products, file.file, fmt)
+
+@router.put("/products/{product_id}", response_model=AdminProductResponse)
 async def admin_update_product(
     product_id: int,
     name: str = Form(...),
@@ -77,10 +164,10 @@ async def admin_update_product(
     is_active: bool = Form(True),
     image: Optional[UploadFile] = File(None),
     current_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Update product"""
-    product_service = ProductService(db)
+    product_service = AsyncProductService(db)
     
     update_data = {
         "name": name,
@@ -94,15 +181,11 @@ async def admin_update_product(
         "is_active": is_active
     }
     
-    # Handle image upload
-    if image:
-        filename = save_uploaded_image(image)
-        if filename:
-            update_data["image_url"] = f"/static/images/products/{filename}"
-    
-    product = product_service.update_product(product_id, update_data)
+    product = await product_service.update_product(product_id, update_data)
     
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    return product
\ No newline at end of file
+    # The previous image stays until the new one's variants exist
+    image_digest = await _queue_image(image, product.id)
+    return _admin_product_response(product, image_digest)
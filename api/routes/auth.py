@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Form
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
-from core.database import get_db
-from services.auth import authenticate_user, create_user, login_for_access_token
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_async_db
+from services.auth import create_user_async, login_for_access_token_async
 from models.schemas import UserCreate, UserResponse, Token
 
 router = APIRouter()
@@ -10,10 +10,10 @@ router = APIRouter()
 @router.post("/login", response_model=Token)
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Login endpoint"""
-    return login_for_access_token(db, form_data.username, form_data.password)
+    return await login_for_access_token_async(db, form_data.username, form_data.password)
 
 @router.post("/register", response_model=UserResponse)
 async def register(
@@ -21,7 +21,7 @@ async def register(
     username: str = Form(...),
     password: str = Form(...),
     full_name: str = Form(None),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Registration endpoint"""
     user_data = UserCreate(
@@ -30,4 +30,4 @@ async def register(
         password=password,
         full_name=full_name
     )
-    return create_user(db, user_data)
\ No newline at end of file
+    return await create_user_async(db, user_data)
\ No newline at end of file
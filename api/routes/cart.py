@@ -1,44 +1,65 @@
 from fastapi import APIRouter, Depends, HTTPException, Form
-from sqlalchemy.orm import Session
-from core.database import get_db
-from services.business import CartService
-from fastapi import Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_async_db
+from services.business import AsyncCartService, InsufficientStock, get_cart_id, new_cart_id, set_cart_cookie
+from fastapi import Request, Response
 
 router = APIRouter()
 
+@router.get("/")
+async def get_cart(
+    request: Request,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Get cart items and total"""
+    cart_service = AsyncCartService(db)
+    cart_items = await cart_service.get_session_cart(request)
+    total = sum(item['price'] * item['quantity'] for item in cart_items)
+    return {"items": cart_items, "total": total}
+
 @router.post("/add")
 async def add_to_cart(
     request: Request,
+    response: Response,
     product_id: int = Form(...),
     quantity: int = Form(1),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Add item to cart"""
-    cart_service = CartService(db)
-    success = cart_service.add_to_cart(request, product_id, quantity)
-    
+    """Add item to cart, holding the stock for settings.inventory_hold_seconds"""
+    cart_service = AsyncCartService(db)
+    cart_id = get_cart_id(request) or new_cart_id()
+    try:
+        success = await cart_service.add_to_cart(cart_id, product_id, quantity)
+    except InsufficientStock as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
     if not success:
         raise HTTPException(status_code=404, detail="Product not found")
-    
+
+    set_cart_cookie(response, cart_id)
     return {"message": "Item added to cart", "success": True}
 
 @router.delete("/remove/{product_id}")
 async def remove_from_cart(
     request: Request,
     product_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Remove item from cart"""
-    cart_service = CartService(db)
-    cart_service.remove_from_cart(request, product_id)
+    cart_id = get_cart_id(request)
+    if cart_id:
+        cart_service = AsyncCartService(db)
+        await cart_service.remove_from_cart(cart_id, product_id)
     return {"message": "Item removed from cart", "success": True}
 
 @router.delete("/clear")
 async def clear_cart(
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Clear all items from cart"""
-    cart_service = CartService(db)
-    cart_service.clear_cart(request)
-    return {"message": "Cart cleared", "success": True}
\ No newline at end of file
+    cart_id = get_cart_id(request)
+    if cart_id:
+        cart_service = AsyncCartService(db)
+        await cart_service.clear_cart(cart_id)
+    return {"message": "Cart cleared", "success": True}
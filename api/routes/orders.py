@@ -0,0 +1,66 @@
+from fastapi import APIRouter, Depends, HTTPException, Form, Header, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from core.database import get_async_db
+from services.auth import get_current_active_user
+from services.business import AsyncCartService, AsyncOrderService, InsufficientStock, get_cart_id
+from models.schemas import User, OrderResponse, OrderHistoryPage
+
+router = APIRouter()
+
+@router.get("/", response_model=OrderHistoryPage)
+async def order_history(
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Current user's orders, newest first"""
+    order_service = AsyncOrderService(db)
+    orders, has_next = await order_service.get_user_orders(current_user.id, page=page, per_page=per_page)
+    return OrderHistoryPage(items=orders, page=page, per_page=per_page, has_next=has_next)
+
+@router.post("/", response_model=OrderResponse)
+async def checkout(
+    request: Request,
+    shipping_address: str = Form(...),
+    billing_address: str = Form(...),
+    payment_method: str = Form(...),
+    idempotency_key: Optional[str] = Header(None, max_length=128),
+    current_user: User = Depends(get_current_active_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Place an order for the current cart.
+    
+    Send an Idempotency-Key header to make retries safe: a repeated key
+    returns the order it originally created.
+    """
+    order_service = AsyncOrderService(db)
+    cart_service = AsyncCartService(db)
+    cart_id = get_cart_id(request)
+    
+    cart_items = await cart_service.get_cart(cart_id) if cart_id else []
+    if not cart_items and not idempotency_key:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+    
+    try:
+        order = await order_service.create_order(
+            current_user.id,
+            cart_items,
+            {
+                "shipping_address": shipping_address,
+                "billing_address": billing_address,
+                "payment_method": payment_method
+            },
+            idempotency_key=idempotency_key,
+            cart_id=cart_id
+        )
+    except InsufficientStock as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if cart_id:
+        await cart_service.clear_cart(cart_id)
+    
+    return await order_service.get_order_by_id(order.id)
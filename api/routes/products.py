@@ -1,50 +1,114 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from core.database import get_db
-from services.business import ProductService
-from models.schemas import ProductResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional, Union
+from core.database import get_async_db
+from services.business import (
+    AsyncProductService, FacetFilter, catalog_validators, json_envelope, product_json, products_json
+)
+from models.schemas import ProductResponse, ProductCursorPage, ProductFacetPage
 
 router = APIRouter()
 
-@router.get("/", response_model=List[ProductResponse])
+# Handlers return pre-encoded bodies assembled from cached per-product JSON;
+# response_model still documents them, but FastAPI skips validating a Response
+
+def facet_payload(counts) -> Dict[str, List[dict]]:
+    """ProductFacets as plain data"""
+    return {
+        name: [{"value": value, "count": count} for value, count in values]
+        for name, values in counts.items()
+    }
+
+def json_response(body: bytes, validators: Dict[str, str]) -> Response:
+    # A returned Response doesn't pick up headers set by dependencies, so pass the validators on
+    return Response(body, media_type="application/json", headers=validators)
+
+@router.get("/", response_model=Union[List[ProductResponse], ProductCursorPage, ProductFacetPage])
 async def get_products(
     category: Optional[str] = Query(None),
     search: Optional[str] = Query(None),
+    size: List[str] = Query([], description="Repeat to match any of several sizes"),
+    color: List[str] = Query([], description="Repeat to match any of several colors"),
+    min_price: Optional[float] = Query(None, ge=0, description="Inclusive"),
+    max_price: Optional[float] = Query(None, ge=0, description="Exclusive"),
+    include_facets: bool = Query(False, description="Return per-facet counts alongside the page"),
     page: int = Query(1, ge=1),
     per_page: int = Query(12, ge=1, le=50),
-    db: Session = Depends(get_db)
+    sort: Optional[str] = Query(None),
+    cursor: Optional[str] = Query(None, description="Pass an empty value to start keyset pagination"),
+    validators: Dict[str, str] = Depends(catalog_validators),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get products with pagination and filtering"""
-    product_service = ProductService(db)
-    products, total_pages = product_service.get_products_paginated(
-        category=category,
-        search=search,
-        page=page,
-        per_page=per_page
-    )
-    return products
+    """Get products with pagination, filtering and optional facet counts"""
+    product_service = AsyncProductService(db)
+    facets = FacetFilter.create(size, color, min_price, max_price)
+    try:
+        if cursor is not None:
+            products, next_cursor = await product_service.get_products_after(
+                category=category,
+                search=search,
+                cursor=cursor,
+                per_page=per_page,
+                sort=sort,
+                facets=facets
+            )
+            body = json_envelope(
+                products_json(products),
+                next_cursor=next_cursor,
+                total=await product_service.count_products(category=category, search=search, facets=facets),
+                facets=facet_payload(
+                    await product_service.get_facet_counts(category=category, search=search, facets=facets)
+                ) if include_facets else None
+            )
+            return json_response(body, validators)
+        
+        products, total_pages = await product_service.get_products_paginated(
+            category=category,
+            search=search,
+            page=page,
+            per_page=per_page,
+            sort=sort,
+            facets=facets
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if include_facets:
+        body = json_envelope(
+            products_json(products),
+            page=page,
+            total_pages=total_pages,
+            facets=facet_payload(
+                await product_service.get_facet_counts(category=category, search=search, facets=facets)
+            )
+        )
+        return json_response(body, validators)
+    return json_response(products_json(products), validators)
 
 @router.get("/featured", response_model=List[ProductResponse])
 async def get_featured_products(
     limit: int = Query(8, ge=1, le=20),
-    db: Session = Depends(get_db)
+    validators: Dict[str, str] = Depends(catalog_validators),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get featured products"""
-    product_service = ProductService(db)
-    return product_service.get_featured_products(limit=limit)
+    product_service = AsyncProductService(db)
+    return json_response(products_json(await product_service.get_featured_products(limit=limit)), validators)
 
-@router.get("/categories")
-async def get_categories(db: Session = Depends(get_db)):
+@router.get("/categories", dependencies=[Depends(catalog_validators)])
+async def get_categories(db: AsyncSession = Depends(get_async_db)):
     """Get all product categories"""
-    product_service = ProductService(db)
-    return {"categories": product_service.get_categories()}
+    product_service = AsyncProductService(db)
+    return {"categories": await product_service.get_categories()}
 
 @router.get("/{product_id}", response_model=ProductResponse)
-async def get_product(product_id: int, db: Session = Depends(get_db)):
+async def get_product(
+    product_id: int,
+    validators: Dict[str, str] = Depends(catalog_validators),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Get product by ID"""
-    product_service = ProductService(db)
-    product = product_service.get_product_by_id(product_id)
+    product_service = AsyncProductService(db)
+    product = await product_service.get_product_by_id(product_id)
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
-    return product
\ No newline at end of file
+    return json_response(product_json(product), validators)
\ No newline at end of file
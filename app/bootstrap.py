@@ -0,0 +1,40 @@
+"""One-shot setup steps kept out of the request-serving process.
+
+`python manage.py migrate` / `seed` run these ahead of deploys; without
+settings.fast_start the app still runs them on boot, as before.
+"""
+import logging
+
+from core.database import AsyncSessionLocal, SessionLocal, refresh_statistics, sync_schema
+from core.search import ensure_search_index
+
+logger = logging.getLogger(__name__)
+
+def migrate(engine):
+    """Bring the schema, search index and planner statistics up to date"""
+    from models.schemas import Base
+    sync_schema(engine, Base.metadata)
+    ensure_search_index(engine)
+    refresh_statistics(engine)
+
+def seed():
+    """Load the sample catalog and admin user into an empty database"""
+    from services.business import init_sample_data
+    db = SessionLocal()
+    try:
+        init_sample_data(db)
+    finally:
+        db.close()
+
+async def prewarm_caches():
+    """Fill the catalog cache with what the first visitors will ask for"""
+    from services.business import AsyncProductService
+    try:
+        async with AsyncSessionLocal() as db:
+            product_service = AsyncProductService(db)
+            await product_service.get_featured_products(limit=8)
+            await product_service.get_categories()
+            await product_service.get_products_paginated(page=1, per_page=12)
+            await product_service.get_facet_counts()
+    except Exception:
+        logger.exception("Cache pre-warm failed")
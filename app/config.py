@@ -3,11 +3,60 @@ from typing import Optional
 
 class Settings(BaseSettings):
     app_name: str = "ASICS Shoe Store"
-    debug: bool = True
+    # Reloads edited templates; on in development through .env
+    debug: bool = False
     database_url: str = "sqlite:///./asics_store.db"
+    async_database_url: Optional[str] = None
+    # Engine tuning profile from core.database.ENGINE_PROFILES
+    db_profile: str = "balanced"
     secret_key: str = "your-secret-key-change-in-production"
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
+    principal_cache_size: int = 10000
+    principal_cache_ttl_seconds: int = 300
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 64
+    image_workers: int = 1
+    cart_ttl_seconds: int = 30 * 24 * 3600
+    cart_memory_size: int = 10000
+    cart_sweep_interval_seconds: int = 3600
+    catalog_cache_size: int = 2048
+    catalog_cache_ttl_seconds: int = 300
+    page_cache_size: int = 512
+    product_fragment_cache_size: int = 20000
+    product_fragment_ttl_seconds: int = 3600
+    import_batch_size: int = 5000
+    import_max_errors: int = 1000
+    export_batch_size: int = 1000
+    page_cache_ttl_seconds: int = 300
+    # Compiled template bytecode; the system temp dir when unset
+    template_cache_dir: Optional[str] = None
+    # Skip schema sync and seeding at startup; run `python manage.py migrate` first
+    fast_start: bool = False
+    prewarm_cache: bool = False
+    metrics_enabled: bool = True
+    # Above 1, main.py serves through gunicorn with a preloaded app
+    workers: int = 1
+    worker_graceful_timeout: int = 30
+    invalidation_poll_seconds: float = 0.5
+    recommendation_top_k: int = 8
+    # Stock added to a cart (or renewed at checkout) is held this long
+    inventory_hold_seconds: int = 15 * 60
+    inventory_sweep_interval_seconds: int = 60
+    # Admission control: concurrent requests per route class, how many more may
+    # queue, and the longest a request may wait. In-flight plus queued across all
+    # classes (492) stays under the hard_limit in fly.toml.
+    admission_enabled: bool = True
+    admission_max_wait_seconds: float = 5.0
+    admission_catalog_limit: int = 64
+    admission_catalog_queue: int = 256
+    admission_auth_limit: int = 16
+    admission_auth_queue: int = 64
+    admission_checkout_limit: int = 8
+    admission_checkout_queue: int = 64
+    admission_admin_limit: int = 4
+    admission_admin_queue: int = 16
     
     class Config:
         env_file = ".env"
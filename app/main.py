@@ -1,106 +1,241 @@
-from fastapi import FastAPI, Request, Depends, HTTPException, status, Form, File, UploadFile
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, Request, Depends, HTTPException, Query, status, Form, File, UploadFile
+from fastapi.responses import HTMLResponse, PlainTextResponse, RedirectResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from typing import Optional, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Awaitable, Callable, Dict, Optional, List
+import asyncio
+import logging
 import os
+from urllib.parse import urlencode
 
-from core.database import get_db, engine
+from core.database import get_db, get_async_db, engine, async_engine, AsyncSessionLocal
+from core.assets import PrecompressedStaticFiles, asset_url, build_assets
+from core.images import image_srcset, image_pipeline
+from core.metrics import MetricsMiddleware, MetricsRegistry, instrument_engine
+from core.admission import AdmissionLimiter, AdmissionMiddleware, render_admission_metrics
 from models.schemas import User, Product, CartItem, Order
+from services.invalidation import InvalidationMiddleware, invalidation_bus
 from services.auth import get_current_user, create_access_token, verify_password, get_password_hash
-from services.business import ProductService, CartService, OrderService
+from services.business import (
+    AsyncProductService, AsyncCartService, AsyncInventoryService, FacetFilter, catalog_validators,
+    catalog_version, get_cart_id, page_cache, parse_price_bucket, product_tag
+)
+from core.cache import MISS
+from app.config import settings
 from api.routes.auth import router as auth_router
 from api.routes.products import router as products_router
 from api.routes.cart import router as cart_router
 from api.routes.admin import router as admin_router
+from api.routes.orders import router as orders_router
 
-# Create database tables
-from models.schemas import Base
-Base.metadata.create_all(bind=engine)
+# Create database tables; fast-start deploys run `python manage.py migrate` ahead of time instead
+from app.bootstrap import migrate, prewarm_caches, seed
+from core.search import ensure_search_index
+if settings.fast_start:
+    ensure_search_index(engine, create=False)
+else:
+    migrate(engine)
 
 app = FastAPI(title="ASICS Shoe Store", description="Premium ASICS footwear e-commerce platform")
 
-# Mount static files
-app.mount("/static", StaticFiles(directory="static"), name="static")
+# Middleware added last runs first: metrics, then admission control, then invalidation
+
+# With several workers, apply other workers' cache invalidations before each request
+if invalidation_bus.enabled:
+    app.add_middleware(InvalidationMiddleware, bus=invalidation_bus)
+
+# Per-class concurrency limits with bounded queues; overload gets a fast 503 instead of a timeout
+admission_limiters = {
+    route_class: AdmissionLimiter(limit, queue, settings.admission_max_wait_seconds)
+    for route_class, limit, queue in (
+        ("catalog", settings.admission_catalog_limit, settings.admission_catalog_queue),
+        ("auth", settings.admission_auth_limit, settings.admission_auth_queue),
+        ("checkout", settings.admission_checkout_limit, settings.admission_checkout_queue),
+        ("admin", settings.admission_admin_limit, settings.admission_admin_queue),
+    )
+}
+
+def admission_class(method: str, path: str) -> Optional[str]:
+    """Route class a request is admitted under; None bypasses admission control"""
+    if path in ("/health", "/metrics") or path.startswith("/static/"):
+        # Health checks must answer even under overload, or the machine gets recycled
+        return None
+    if path.startswith("/auth/"):
+        return "auth"
+    if path.startswith("/admin/"):
+        return "admin"
+    if path.startswith(("/api/orders", "/api/cart")) and method not in ("GET", "HEAD"):
+        return "checkout"
+    return "catalog"
+
+if settings.admission_enabled:
+    app.add_middleware(AdmissionMiddleware, limiters=admission_limiters, classify=admission_class)
+
+# Per-route latency, status and query counts, served at /metrics
+metrics = MetricsRegistry()
+if settings.metrics_enabled:
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+    app.add_middleware(MetricsMiddleware, registry=metrics)
+
+# Mount static files; fingerprinted copies and .gz/.br siblings are built up front
+build_assets()
+app.mount("/static", PrecompressedStaticFiles(directory="static"), name="static")
 
 # Templates
 templates = Jinja2Templates(directory="templates")
+# Compiled templates persist across restarts (the image precompiles them into
+# TEMPLATE_CACHE_DIR); outside debug, skip the per-render mtime check
+if settings.template_cache_dir:
+    os.makedirs(settings.template_cache_dir, exist_ok=True)
+templates.env.bytecode_cache = FileSystemBytecodeCache(settings.template_cache_dir)
+templates.env.auto_reload = settings.debug
+templates.env.globals["image_srcset"] = image_srcset
+templates.env.globals["asset_url"] = asset_url
 
 # Include routers
 app.include_router(auth_router, prefix="/auth", tags=["authentication"])
 app.include_router(products_router, prefix="/api/products", tags=["products"])
 app.include_router(cart_router, prefix="/api/cart", tags=["cart"])
 app.include_router(admin_router, prefix="/admin", tags=["admin"])
+app.include_router(orders_router, prefix="/api/orders", tags=["orders"])
+
+async def render_cached_page(
+    request: Request,
+    key: tuple,
+    template_name: str,
+    build_context: Callable[[], Awaitable[dict]],
+    headers: Dict[str, str]
+) -> HTMLResponse:
+    """Serve a storefront page from the page cache, rendering it on a miss.
+    
+    These pages carry no per-visitor state, so one rendering serves everyone.
+    Each is tagged with the products it shows, so stock changes drop just those.
+    """
+    generation = page_cache.generation
+    html = page_cache.get(key)
+    if html is MISS:
+        context = await build_context()
+        html = templates.get_template(template_name).render({"request": request, **context})
+        # A write landing mid-render may already have dropped this page; don't re-fill it with the old one
+        if headers["ETag"] == catalog_version.etag:
+            page_cache.set(key, html, tags=page_tags(context), generation=generation)
+    return HTMLResponse(html, headers=headers)
+
+def page_tags(context: dict) -> List[tuple]:
+    """Tags of every product a page's context shows"""
+    products = list(context.get("products", ())) + list(context.get("related_products", ()))
+    if context.get("product") is not None:
+        products.append(context["product"])
+    return [product_tag(product.id) for product in products]
+
+def _normalize(value: Optional[str]) -> Optional[str]:
+    """Collapse whitespace so equivalent query strings share a cache entry"""
+    value = " ".join(value.split()) if value else ""
+    return value or None
 
 @app.get("/", response_class=HTMLResponse)
-async def home(request: Request, db: Session = Depends(get_db)):
+async def home(
+    request: Request,
+    validators: Dict[str, str] = Depends(catalog_validators),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Home page with featured products"""
-    product_service = ProductService(db)
-    featured_products = product_service.get_featured_products(limit=8)
+    async def build_context():
+        product_service = AsyncProductService(db)
+        return {
+            "products": await product_service.get_featured_products(limit=8),
+            "page_title": "ASICS Shoe Store - Premium Running Shoes"
+        }
     
-    return templates.TemplateResponse("home.html", {
-        "request": request,
-        "products": featured_products,
-        "page_title": "ASICS Shoe Store - Premium Running Shoes"
-    })
+    return await render_cached_page(request, ("home",), "home.html", build_context, validators)
 
 @app.get("/products", response_class=HTMLResponse)
 async def products_page(
     request: Request, 
     category: Optional[str] = None,
     search: Optional[str] = None,
+    size: List[str] = Query([]),
+    color: List[str] = Query([]),
+    price: Optional[str] = None,
     page: int = 1,
-    db: Session = Depends(get_db)
+    validators: Dict[str, str] = Depends(catalog_validators),
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Products listing page"""
-    product_service = ProductService(db)
-    products, total_pages = product_service.get_products_paginated(
-        category=category, 
-        search=search, 
-        page=page, 
-        per_page=12
-    )
+    category = _normalize(category)
+    search = _normalize(search)
+    min_price, max_price = parse_price_bucket(price)
+    price = price if min_price is not None else None
+    facets = FacetFilter.create(size, color, min_price, max_price)
+    page = max(page, 1)
     
-    categories = product_service.get_categories()
+    async def build_context():
+        product_service = AsyncProductService(db)
+        products, total_pages = await product_service.get_products_paginated(
+            category=category, 
+            search=search, 
+            page=page, 
+            per_page=12,
+            facets=facets
+        )
+        filter_params = [("category", category), ("search", search)]
+        filter_params += [("size", value) for value in facets.sizes]
+        filter_params += [("color", value) for value in facets.colors]
+        filter_params.append(("price", price))
+        filter_params = [(name, value) for name, value in filter_params if value]
+        return {
+            "products": products,
+            "categories": await product_service.get_categories(),
+            "facet_counts": await product_service.get_facet_counts(category=category, search=search, facets=facets),
+            "facets": facets,
+            "current_price": price,
+            "current_category": category,
+            "search_query": search,
+            "filter_query": "&" + urlencode(filter_params) if filter_params else "",
+            "current_page": page,
+            "total_pages": total_pages,
+            "page_title": "ASICS Shoes - All Products"
+        }
     
-    return templates.TemplateResponse("products.html", {
-        "request": request,
-        "products": products,
-        "categories": categories,
-        "current_category": category,
-        "search_query": search,
-        "current_page": page,
-        "total_pages": total_pages,
-        "page_title": "ASICS Shoes - All Products"
-    })
+    key = ("products", category, search, facets, page)
+    return await render_cached_page(request, key, "products.html", build_context, validators)
 
 @app.get("/product/{product_id}", response_class=HTMLResponse)
-async def product_detail(request: Request, product_id: int, db: Session = Depends(get_db)):
+async def product_detail(
+    request: Request,
+    product_id: int,
+    validators: Dict[str, str] = Depends(catalog_validators),
+    db: AsyncSession = Depends(get_async_db)
+):
     """Product detail page"""
-    product_service = ProductService(db)
-    product = product_service.get_product_by_id(product_id)
+    async def build_context():
+        product_service = AsyncProductService(db)
+        product = await product_service.get_product_by_id(product_id)
+        
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        
+        # Get related products
+        related_products = await product_service.get_related_products(product.category, product_id, limit=4)
+        return {
+            "product": product,
+            "related_products": related_products,
+            "page_title": f"{product.name} - ASICS Shoe Store"
+        }
     
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    
-    # Get related products
-    related_products = product_service.get_related_products(product.category, product_id, limit=4)
-    
-    return templates.TemplateResponse("product_detail.html", {
-        "request": request,
-        "product": product,
-        "related_products": related_products,
-        "page_title": f"{product.name} - ASICS Shoe Store"
-    })
+    key = ("product", product_id)
+    return await render_cached_page(request, key, "product_detail.html", build_context, validators)
 
 @app.get("/cart", response_class=HTMLResponse)
-async def cart_page(request: Request, db: Session = Depends(get_db)):
+async def cart_page(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Shopping cart page"""
     # Get cart from session (simplified for demo)
-    cart_service = CartService(db)
-    cart_items = cart_service.get_session_cart(request)
+    cart_service = AsyncCartService(db)
+    cart_items = await cart_service.get_session_cart(request)
     
     total = sum(item['price'] * item['quantity'] for item in cart_items)
     
@@ -112,19 +247,22 @@ async def cart_page(request: Request, db: Session = Depends(get_db)):
     })
 
 @app.get("/checkout", response_class=HTMLResponse)
-async def checkout_page(request: Request, db: Session = Depends(get_db)):
+async def checkout_page(request: Request, db: AsyncSession = Depends(get_async_db)):
     """Checkout page"""
-    cart_service = CartService(db)
-    cart_items = cart_service.get_session_cart(request)
+    cart_service = AsyncCartService(db)
+    cart_items = await cart_service.get_session_cart(request)
     
     if not cart_items:
         return RedirectResponse(url="/cart", status_code=302)
     
+    # Hold the stock while the customer fills in the form
+    unavailable = await cart_service.hold_for_checkout(get_cart_id(request))
     total = sum(item['price'] * item['quantity'] for item in cart_items)
     
     return templates.TemplateResponse("checkout.html", {
         "request": request,
         "cart_items": cart_items,
+        "unavailable": unavailable,
         "total": total,
         "page_title": "Checkout - ASICS Shoe Store"
     })
@@ -150,10 +288,75 @@ async def health_check():
     """Health check endpoint for deployment"""
     return {"status": "healthy", "service": "ASICS Shoe Store"}
 
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics_endpoint():
+    """Request metrics in the Prometheus text exposition format"""
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+    body = metrics.render()
+    if settings.admission_enabled:
+        body += render_admission_metrics(admission_limiters)
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+logger = logging.getLogger(__name__)
+
+async def sweep_abandoned_carts():
+    """Periodically drop carts past their TTL, and invalidation log entries every worker has seen"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                removed = await AsyncCartService(db).sweep_expired()
+            if removed:
+                logger.info("Swept %d abandoned carts", removed)
+            await run_in_threadpool(invalidation_bus.prune, settings.cart_sweep_interval_seconds)
+        except Exception:
+            logger.exception("Cart sweep failed")
+        await asyncio.sleep(settings.cart_sweep_interval_seconds)
+
+async def release_expired_holds():
+    """Periodically put stock from expired cart holds back on sale"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                released = await AsyncInventoryService(db).sweep_expired()
+            if released:
+                logger.info("Released %d units from expired holds", released)
+        except Exception:
+            logger.exception("Inventory hold sweep failed")
+        await asyncio.sleep(settings.inventory_sweep_interval_seconds)
+
+async def follow_invalidations():
+    """Keep applying other workers' invalidations while idle, so none are pruned unseen"""
+    while True:
+        try:
+            await run_in_threadpool(invalidation_bus.poll)
+        except Exception:
+            logger.exception("Invalidation poll failed")
+        await asyncio.sleep(settings.invalidation_poll_seconds)
+
 # Initialize sample data
 @app.on_event("startup")
 async def startup_event():
     """Initialize sample data on startup"""
-    from services.business import init_sample_data
-    db = next(get_db())
-    init_sample_data(db)
\ No newline at end of file
+    if not settings.fast_start:
+        seed()
+    app.state.cart_sweeper = asyncio.create_task(sweep_abandoned_carts())
+    app.state.hold_sweeper = asyncio.create_task(release_expired_holds())
+    invalidation_bus.start(engine)
+    if invalidation_bus.active:
+        # Carry on from the other workers' version numbering instead of starting over
+        catalog_version.bump(invalidation_bus.last_id)
+        app.state.invalidation_follower = asyncio.create_task(follow_invalidations())
+    if settings.prewarm_cache:
+        # In the background so the first request isn't held up behind it
+        app.state.cache_prewarm = asyncio.create_task(prewarm_caches())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work, letting in-flight image processing finish"""
+    app.state.cart_sweeper.cancel()
+    app.state.hold_sweeper.cancel()
+    if invalidation_bus.active:
+        app.state.invalidation_follower.cancel()
+        invalidation_bus.stop()
+    image_pipeline.shutdown()
@@ -0,0 +1,312 @@
+"""Catalog load benchmark.
+
+Seeds a deterministic synthetic catalog (products, users, orders and order
+items, bulk-inserted) and drives the ASGI app in-process with concurrent
+clients across the main storefront, API, login and checkout routes. It
+reports throughput and p50/p95/p99 latency per scenario, can save the
+results as JSON, and can compare them against a saved baseline, exiting
+non-zero when a scenario regresses past the threshold.
+
+    python -m benchmarks.catalog_load --products 100000 --order-items 1000000 --output baseline.json
+    python -m benchmarks.catalog_load --database-url sqlite:////tmp/bench.db --baseline baseline.json
+
+Seeding is skipped when the database already holds the requested catalog,
+so pointing --database-url at a file makes repeated runs cheap.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+CATEGORIES = ["Running", "Trail", "Tennis", "Walking", "Training", "Racing", "Kids", "Lifestyle"]
+MODELS = ["GEL-Kayano", "GEL-Nimbus", "Novablast", "GEL-Cumulus", "Metaspeed", "Magic Speed", "GT-2000", "Superblast"]
+SIZES = [f"US {size}" for size in (6, 7, 8, 9, 10, 11, 12, 13)]
+COLORS = ["Black/White", "Blue/Yellow", "Red/White", "Green/Black", "Grey/Orange", "Pink/White"]
+SEARCH_TERMS = ["kayano", "nimbus", "novablast", "cumulus", "metaspeed", "trail"]
+PASSWORD = "bench-pass"
+BATCH = 10000
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def seed_catalog(engine, products: int, users: int, order_items: int, seed: int):
+    """Bulk-insert a reproducible catalog; the same arguments always produce the same rows"""
+    from sqlalchemy import func, insert, select
+    from sqlalchemy.orm import Session
+    from core.database import refresh_statistics
+    from core.security import get_password_hash
+    from models.schemas import Order, OrderItem, Product, User
+    from services.business import RecommendationService
+
+    with engine.begin() as conn:
+        if conn.execute(select(func.count()).select_from(Product.__table__)).scalar() >= products:
+            return False
+
+    rng = random.Random(seed)
+
+    def batches(rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == BATCH:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    product_rows = (
+        {
+            "sku": f"BENCH-{i:07d}",
+            "name": f"{MODELS[i % len(MODELS)]} {i // len(MODELS) % 40 + 1}",
+            "description": f"{CATEGORIES[i % len(CATEGORIES)]} shoe, synthetic catalog entry {i}",
+            "price": round(rng.uniform(40, 260), 2),
+            "category": CATEGORIES[rng.randrange(len(CATEGORIES))],
+            "brand": "ASICS",
+            "size": rng.choice(SIZES),
+            "color": rng.choice(COLORS),
+            "stock_quantity": 1_000_000,
+            "is_featured": i % 500 == 0,
+            "is_active": True,
+        }
+        for i in range(products)
+    )
+    # One bcrypt hash shared by every user keeps seeding fast
+    hashed = get_password_hash(PASSWORD)
+    user_rows = (
+        {"email": f"bench{i}@example.com", "username": f"bench{i}", "hashed_password": hashed, "is_active": True}
+        for i in range(users)
+    )
+    lines_per_order = 4
+    orders = max(order_items // lines_per_order, 0)
+    order_rows = (
+        {
+            "id": i + 1,
+            "order_number": f"BENCH-{i:08d}",
+            "user_id": rng.randint(1, users),
+            "total_amount": 0.0,
+            "status": "delivered",
+        }
+        for i in range(orders)
+    )
+    item_rows = (
+        {
+            "order_id": i // lines_per_order + 1,
+            "product_id": rng.randint(1, products),
+            "quantity": rng.randint(1, 3),
+            "price": round(rng.uniform(40, 260), 2),
+        }
+        for i in range(orders * lines_per_order)
+    )
+
+    for table, rows in ((Product, product_rows), (User, user_rows), (Order, order_rows), (OrderItem, item_rows)):
+        started = time.perf_counter()
+        count = 0
+        for batch in batches(rows):
+            with engine.begin() as conn:
+                conn.execute(insert(table.__table__), batch)
+            count += len(batch)
+        print(f"seeded {count} {table.__tablename__} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    started = time.perf_counter()
+    db = Session(engine)
+    try:
+        RecommendationService(db).rebuild()
+    finally:
+        db.close()
+    print(f"built recommendations in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    refresh_statistics(engine)
+    return True
+
+# Each scenario is one measured operation: fn(client, rng, context) -> list of responses.
+# The weight scales --requests, so bcrypt-bound login doesn't dominate the run time.
+
+async def home(client, rng, context):
+    return [await client.get("/")]
+
+async def listing(client, rng, context):
+    return [await client.get("/products", params={"page": rng.randint(1, 50)})]
+
+async def listing_filtered(client, rng, context):
+    params = {"category": rng.choice(CATEGORIES), "size": rng.choice(SIZES), "page": rng.randint(1, 5)}
+    return [await client.get("/products", params=params)]
+
+async def search(client, rng, context):
+    return [await client.get("/products", params={"search": rng.choice(SEARCH_TERMS)})]
+
+async def product_detail(client, rng, context):
+    return [await client.get(f"/product/{rng.randint(1, context['products'])}")]
+
+async def api_products(client, rng, context):
+    params = {"category": rng.choice(CATEGORIES), "cursor": "", "per_page": 24}
+    return [await client.get("/api/products/", params=params)]
+
+async def api_facets(client, rng, context):
+    params = {"category": rng.choice(CATEGORIES), "include_facets": "true"}
+    return [await client.get("/api/products/", params=params)]
+
+async def login(client, rng, context):
+    username = f"bench{rng.randrange(context['users'])}"
+    return [await client.post("/auth/login", data={"username": username, "password": PASSWORD})]
+
+async def checkout(client, rng, context):
+    added = await client.post(
+        "/api/cart/add", data={"product_id": rng.randint(1, context["products"]), "quantity": rng.randint(1, 2)}
+    )
+    placed = await client.post(
+        "/api/orders/",
+        data={"shipping_address": "1 Bench St", "billing_address": "1 Bench St", "payment_method": "card"},
+        headers={"Authorization": f"Bearer {context['token']}"}
+    )
+    return [added, placed]
+
+SCENARIOS = {
+    "home": (home, 1.0),
+    "listing": (listing, 1.0),
+    "listing_filtered": (listing_filtered, 1.0),
+    "search": (search, 1.0),
+    "product_detail": (product_detail, 1.0),
+    "api_products": (api_products, 1.0),
+    "api_facets": (api_facets, 1.0),
+    "login": (login, 0.1),
+    "checkout": (checkout, 0.25),
+}
+
+async def run_scenario(app, name: str, requests: int, concurrency: int, seed: int, context: dict):
+    import httpx
+
+    fn, weight = SCENARIOS[name]
+    total = max(int(requests * weight), concurrency)
+    remaining = iter(range(total))
+    latencies, statuses = [], {}
+    transport = httpx.ASGITransport(app=app)
+
+    async def worker(index: int):
+        rng = random.Random(f"{seed}-{name}-{index}")
+        worker_context = dict(context)
+        # A client per worker: separate cookie jars, so each has its own cart
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            if name == "checkout":
+                response = await client.post(
+                    "/auth/login", data={"username": f"bench{index % context['users']}", "password": PASSWORD}
+                )
+                worker_context["token"] = response.json()["access_token"]
+            while next(remaining, None) is not None:
+                start = time.perf_counter()
+                responses = await fn(client, rng, worker_context)
+                latencies.append(time.perf_counter() - start)
+                for response in responses:
+                    statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "requests": total,
+        "errors": sum(count for status, count in statuses.items() if status >= 400),
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "requests_per_s": round(total / elapsed, 1),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+    }
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Scenarios whose throughput dropped or p95 grew by more than threshold, as messages"""
+    regressions = []
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if previous is None:
+            continue
+        if current["requests_per_s"] < previous["requests_per_s"] * (1 - threshold):
+            regressions.append(
+                f"{name}: throughput {previous['requests_per_s']} -> {current['requests_per_s']} req/s"
+            )
+        if current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+            regressions.append(f"{name}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--products", type=int, default=100000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--order-items", type=int, default=1000000)
+    parser.add_argument("--requests", type=int, default=1000, help="per scenario, before its weight")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--database-url", default=None, help="defaults to a throwaway SQLite file")
+    parser.add_argument("--output", default=None, help="write results as JSON")
+    parser.add_argument("--baseline", default=None, help="JSON from a previous run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed fractional regression")
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+
+    # Importing the app migrates the schema; ASGITransport skips lifespan, so no sample data or sweeper
+    from app.main import app
+    from app.config import settings
+    from core.database import engine
+
+    seed_catalog(engine, args.products, args.users, args.order_items, args.seed)
+    context = {"products": args.products, "users": args.users}
+
+    results = {
+        "meta": {
+            "products": args.products,
+            "users": args.users,
+            "order_items": args.order_items,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "seed": args.seed,
+            "db_profile": settings.db_profile,
+            "bcrypt_rounds": settings.bcrypt_rounds,
+            "python": platform.python_version(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "scenarios": {},
+    }
+    print(f"{'scenario':<18}{'req':>7}{'err':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+
+    async def run_all():
+        # One event loop for every scenario: pooled async connections belong to it
+        for name in args.scenarios:
+            result = await run_scenario(app, name, args.requests, args.concurrency, args.seed, context)
+            results["scenarios"][name] = result
+            print(
+                f"{name:<18}{result['requests']:>7}{result['errors']:>6}{result['requests_per_s']:>10}"
+                f"{result['p50_ms']:>10}{result['p95_ms']:>10}{result['p99_ms']:>10}"
+            )
+
+    asyncio.run(run_all())
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Checkout throughput benchmark.
+
+Concurrent writer threads place orders through OrderService.create_order
+against a throwaway SQLite database in WAL mode, and compare it with the
+previous two-commit, row-by-row implementation. Runs under both
+synchronous=FULL (an fsync per commit) and NORMAL.
+
+    python -m benchmarks.checkout_throughput --orders 2000 --writers 8 --lines 5
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+def make_engine(path: str, synchronous: str):
+    from sqlalchemy import create_engine, event
+
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False}, pool_size=32)
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+        cursor.execute("PRAGMA busy_timeout=10000")
+        cursor.close()
+
+    return engine
+
+def seed(session_factory, products: int, users: int):
+    from models.schemas import Product, User
+
+    db = session_factory()
+    # Enough stock that no order is refused; create_order takes it off stock_quantity
+    db.add_all(
+        Product(name=f"Bench {i}", price=round(50 + i % 100, 2), category="Bench", stock_quantity=1_000_000)
+        for i in range(products)
+    )
+    db.add_all(
+        User(email=f"u{i}@bench", username=f"u{i}", hashed_password="x") for i in range(users)
+    )
+    db.commit()
+    db.close()
+
+def legacy_create_order(db, user_id, cart_items, order_data):
+    """The pre-change implementation: two commits and one INSERT per line"""
+    from core.utils import generate_order_number
+    from models.schemas import Order, OrderItem
+
+    order = Order(
+        order_number=generate_order_number(),
+        user_id=user_id,
+        total_amount=sum(item['price'] * item['quantity'] for item in cart_items),
+        **order_data
+    )
+    db.add(order)
+    db.commit()
+    db.refresh(order)
+    for item in cart_items:
+        db.add(OrderItem(order_id=order.id, product_id=item['product_id'], quantity=item['quantity'], price=item['price']))
+    db.commit()
+    return order
+
+def run(session_factory, mode: str, orders: int, writers: int, lines: int, products: int, users: int):
+    from services.business import OrderService
+
+    order_data = {"shipping_address": "1 Bench St", "billing_address": "1 Bench St", "payment_method": "card"}
+    counter = iter(range(orders))
+    lock = threading.Lock()
+    errors = []
+
+    def writer(seed_value):
+        rng = random.Random(seed_value)
+        db = session_factory()
+        while True:
+            with lock:
+                n = next(counter, None)
+            if n is None:
+                break
+            cart_items = [
+                {"product_id": pid, "quantity": rng.randint(1, 3), "price": 1.0}
+                for pid in rng.sample(range(1, products + 1), lines)
+            ]
+            user_id = rng.randint(1, users)
+            try:
+                if mode == "legacy":
+                    legacy_create_order(db, user_id, cart_items, order_data)
+                else:
+                    OrderService(db).create_order(user_id, cart_items, order_data, idempotency_key=f"bench-{mode}-{n}")
+            except Exception as e:
+                db.rollback()
+                errors.append(repr(e))
+        db.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    # Throughput counts only orders that were placed
+    return {"mode": mode, "orders": orders - len(errors), "elapsed_s": round(elapsed, 3),
+            "orders_per_s": round((orders - len(errors)) / elapsed, 1), "errors": len(errors)}, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--lines", type=int, default=5)
+    parser.add_argument("--products", type=int, default=500)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--synchronous", nargs="+", default=["FULL", "NORMAL"], choices=["OFF", "NORMAL", "FULL"])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/app.db")
+
+    from sqlalchemy.orm import sessionmaker
+    from models.schemas import Base
+
+    failed = False
+    for synchronous in args.synchronous:
+        for mode in ("legacy", "single-transaction"):
+            engine = make_engine(os.path.join(workdir, f"{mode}-{synchronous}.db"), synchronous)
+            Base.metadata.create_all(bind=engine)
+            session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+            seed(session_factory, args.products, args.users)
+            result, errors = run(session_factory, mode, args.orders, args.writers, args.lines, args.products, args.users)
+            print(f"synchronous={synchronous}  " + "  ".join(f"{key}={value}" for key, value in result.items()))
+            if errors:
+                print(f"  first error: {errors[0]}")
+                failed = True
+            engine.dispose()
+    if failed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
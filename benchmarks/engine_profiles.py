@@ -0,0 +1,113 @@
+"""Engine profile benchmark.
+
+Runs a mixed read/write workload against a throwaway SQLite database under
+each tuning profile in core.database.ENGINE_PROFILES. Readers look up
+products by id and page through a category. Writers update stock and commit
+one row per transaction. The benchmark reports operations per second and
+lock errors for each.
+
+    python -m benchmarks.engine_profiles --seconds 5 --readers 8 --writers 2
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+
+def seed(engine, products: int):
+    from sqlalchemy.orm import Session
+    from models.schemas import Base, Product
+
+    Base.metadata.create_all(bind=engine)
+    with Session(engine) as db:
+        db.add_all(
+            Product(name=f"Bench {i}", price=round(50 + i % 100, 2), category=f"Cat {i % 10}", stock_quantity=10)
+            for i in range(products)
+        )
+        db.commit()
+
+def run(engine, seconds: float, readers: int, writers: int, products: int):
+    from sqlalchemy import select, update
+    from models.schemas import Product
+
+    deadline = time.perf_counter() + seconds
+    counts = {"reads": 0, "writes": 0, "errors": 0}
+    lock = threading.Lock()
+
+    def reader(seed_value):
+        rng = random.Random(seed_value)
+        done = errors = 0
+        with engine.connect() as conn:
+            while time.perf_counter() < deadline:
+                try:
+                    conn.execute(select(Product).where(Product.id == rng.randint(1, products))).first()
+                    conn.execute(
+                        select(Product).where(Product.category == f"Cat {rng.randrange(10)}")
+                        .order_by(Product.price).offset(rng.randrange(50)).limit(12)
+                    ).all()
+                    conn.rollback()
+                    done += 1
+                except Exception:
+                    conn.rollback()
+                    errors += 1
+        with lock:
+            counts["reads"] += done
+            counts["errors"] += errors
+
+    def writer(seed_value):
+        rng = random.Random(seed_value)
+        done = errors = 0
+        with engine.connect() as conn:
+            while time.perf_counter() < deadline:
+                try:
+                    conn.execute(
+                        update(Product).where(Product.id == rng.randint(1, products))
+                        .values(stock_quantity=rng.randint(0, 50))
+                    )
+                    conn.commit()
+                    done += 1
+                except Exception:
+                    conn.rollback()
+                    errors += 1
+        with lock:
+            counts["writes"] += done
+            counts["errors"] += errors
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(1000 + i,)) for i in range(writers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {
+        "reads_per_s": round(counts["reads"] / elapsed, 1),
+        "writes_per_s": round(counts["writes"] / elapsed, 1),
+        "errors": counts["errors"],
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--products", type=int, default=5000)
+    parser.add_argument("--profiles", nargs="+", default=None)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/app.db")
+
+    from core.database import ENGINE_PROFILES, create_tuned_engine
+
+    for profile in args.profiles or list(ENGINE_PROFILES):
+        engine = create_tuned_engine(f"sqlite:///{os.path.join(workdir, profile)}.db", profile)
+        seed(engine, args.products)
+        result = run(engine, args.seconds, args.readers, args.writers, args.products)
+        print(f"profile={profile}  " + "  ".join(f"{key}={value}" for key, value in result.items()))
+        engine.dispose()
+
+if __name__ == "__main__":
+    main()
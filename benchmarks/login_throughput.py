@@ -0,0 +1,107 @@
+"""Login throughput benchmark.
+
+Drives POST /auth/login in-process with concurrent clients while a probe
+hits /health, so both bcrypt throughput and event-loop responsiveness during
+a login burst are visible.
+
+    python -m benchmarks.login_throughput --requests 200 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run(requests: int, concurrency: int):
+    import httpx
+    from app.main import app
+    from core.database import SessionLocal
+    from core.security import get_password_hash
+    from models.schemas import User
+
+    db = SessionLocal()
+    if not db.query(User).filter(User.username == "bench").first():
+        db.add(User(email="bench@example.com", username="bench", hashed_password=get_password_hash("bench-pass")))
+        db.commit()
+    db.close()
+
+    login_latencies = []
+    health_latencies = []
+    statuses = {}
+    done = asyncio.Event()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        queue = asyncio.Queue()
+        for _ in range(requests):
+            queue.put_nowait(None)
+
+        async def login_worker():
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                start = time.perf_counter()
+                response = await client.post("/auth/login", data={"username": "bench", "password": "bench-pass"})
+                login_latencies.append(time.perf_counter() - start)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def health_probe():
+            while not done.is_set():
+                start = time.perf_counter()
+                await client.get("/health")
+                health_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.01)
+
+        probe = asyncio.create_task(health_probe())
+        started = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe
+
+    ms = lambda seconds: round(seconds * 1000, 2)
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "logins_per_s": round(requests / elapsed, 1),
+        "statuses": statuses,
+        "login_p50_ms": ms(percentile(login_latencies, 50)),
+        "login_p99_ms": ms(percentile(login_latencies, 99)),
+        "health_p50_ms": ms(percentile(health_latencies, 50)),
+        "health_p99_ms": ms(percentile(health_latencies, 99)),
+        "health_max_ms": ms(max(health_latencies, default=0.0)),
+        "health_mean_ms": ms(statistics.mean(health_latencies)) if health_latencies else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--database-url", default=None, help="defaults to a throwaway SQLite file")
+    args = parser.parse_args()
+
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    else:
+        os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+
+    from app.config import settings
+    result = asyncio.run(run(args.requests, args.concurrency))
+    result["bcrypt_rounds"] = settings.bcrypt_rounds
+    result["password_hash_workers"] = settings.password_hash_workers
+    for key, value in result.items():
+        print(f"{key:>24}: {value}")
+
+if __name__ == "__main__":
+    main()
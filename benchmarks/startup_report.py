@@ -0,0 +1,103 @@
+"""Startup time report.
+
+Measures what a scale-to-zero cold start costs: cumulative import time per
+module for `import app.main` (from `python -X importtime`), and wall time
+from spawning uvicorn to the first 200 on /health. Run it once with the
+defaults and once with --fast-start to compare.
+
+    python -m benchmarks.startup_report --top 15
+    python -m benchmarks.startup_report --fast-start --prewarm
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+def import_times(env: dict, top: int):
+    """(cumulative_us, self_us, module) for the slowest top-level imports of app.main"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.main"],
+        env=env, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Nesting is shown by two spaces of indent per level
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append((int(cumulative_us), int(self_us), depth, name.strip()))
+    total = next((row[0] for row in rows if row[3] == "app.main"), 0)
+    # What app.main pulls in directly, plus first-party modules wherever they load
+    shown = [
+        (cumulative_us, self_us, name) for cumulative_us, self_us, depth, name in rows
+        if depth <= 1 or name.split(".")[0] in ("app", "core", "services", "api", "models")
+    ]
+    shown.sort(reverse=True)
+    return total, shown[:top]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def time_to_first_health(env: dict, timeout: float) -> float:
+    """Seconds from spawning uvicorn to the first 200 on /health"""
+    import httpx
+
+    port = free_port()
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env
+    )
+    try:
+        while time.perf_counter() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with {server.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1).status_code == 200:
+                    return time.perf_counter() - started
+            except httpx.TransportError:
+                pass
+            time.sleep(0.01)
+        raise RuntimeError(f"/health did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--fast-start", action="store_true", help="migrate/seed up front, then boot with FAST_START")
+    parser.add_argument("--prewarm", action="store_true")
+    parser.add_argument("--timeout", type=float, default=60)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{workdir}/app.db")
+    env.pop("ASYNC_DATABASE_URL", None)
+    if args.fast_start:
+        for command in ("migrate", "seed", "build-assets"):
+            subprocess.run([sys.executable, "manage.py", command], env=env, check=True)
+        env["FAST_START"] = "true"
+    if args.prewarm:
+        env["PREWARM_CACHE"] = "true"
+
+    # Warm the bytecode caches first so the numbers reflect a booted image, not a fresh checkout
+    subprocess.run([sys.executable, "-c", "import app.main"], env=env, check=True)
+
+    total, rows = import_times(env, args.top)
+    print(f"import app.main: {total / 1000:.1f} ms")
+    print(f"{'cumulative ms':>14}  {'self ms':>8}  module")
+    for cumulative_us, self_us, name in rows:
+        print(f"{cumulative_us / 1000:>14.1f}  {self_us / 1000:>8.1f}  {name}")
+
+    elapsed = time_to_first_health(env, args.timeout)
+    print(f"time to first 200 on /health: {elapsed * 1000:.0f} ms")
+
+if __name__ == "__main__":
+    main()
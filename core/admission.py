@@ -0,0 +1,133 @@
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
+from core.metrics import format_labels
+
+class Overloaded(Exception):
+    """Raised when a request can't be admitted before its deadline"""
+    
+    def __init__(self, retry_after: float):
+        self.retry_after = retry_after
+
+class AdmissionLimiter:
+    """Concurrency limit with a bounded FIFO queue for one class of routes.
+    
+    A request that would wait longer than max_wait (by queue position and the
+    recent average service time) is rejected on arrival, not after timing out,
+    so clients hear back while they can still retry elsewhere.
+    """
+    
+    def __init__(self, limit: int, max_queue: int, max_wait: float):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.rejected = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        # Exponentially weighted average of how long an admitted request holds its slot
+        self._service_time = 0.05
+    
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+    
+    def estimated_wait(self, position: int) -> float:
+        """Expected seconds until the request at queue position (0-based) is admitted"""
+        return (position + 1) * self._service_time / self.limit
+    
+    async def acquire(self):
+        if self.in_flight < self.limit and not self._waiters:
+            self.in_flight += 1
+            return
+        wait = self.estimated_wait(len(self._waiters))
+        if len(self._waiters) >= self.max_queue or wait > self.max_wait:
+            self.rejected += 1
+            raise Overloaded(wait)
+    
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.max_wait)
+        except asyncio.TimeoutError:
+            if waiter.done():
+                # Handed a slot just as the deadline passed: give it to the next in line
+                self.release(0.0)
+            else:
+                self._waiters.remove(waiter)
+                # No slot freed up for max_wait, and nothing may have been released yet to
+                # correct the estimate: raise it so the next arrivals are shed up front
+                self._service_time = max(self._service_time, self.max_wait)
+            self.rejected += 1
+            raise Overloaded(self.estimated_wait(len(self._waiters)))
+        except asyncio.CancelledError:
+            # Client went away while queued
+            if waiter.done():
+                self.release(0.0)
+            else:
+                self._waiters.remove(waiter)
+            raise
+    
+    def release(self, held_for: float):
+        """Free a slot, handing it straight to the oldest waiter if there is one"""
+        if held_for:
+            self._service_time = 0.8 * self._service_time + 0.2 * held_for
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # in_flight is unchanged: the slot passes to the waiter
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+class AdmissionMiddleware:
+    """Admits requests per route class, answering 503 + Retry-After when a class is saturated.
+    
+    classify(method, path) names the class for a request, or returns None for
+    requests that must always be served (health checks).
+    """
+    
+    def __init__(self, app: ASGIApp, limiters: Dict[str, AdmissionLimiter], classify: Callable[[str, str], Optional[str]]):
+        self.app = app
+        self.limiters = limiters
+        self.classify = classify
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        route_class = self.classify(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if route_class is None:
+            await self.app(scope, receive, send)
+            return
+    
+        limiter = self.limiters[route_class]
+        try:
+            await limiter.acquire()
+        except Overloaded as e:
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry shortly"},
+                status_code=503,
+                headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+    
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - started)
+
+def render_admission_metrics(limiters: Dict[str, AdmissionLimiter]) -> str:
+    """Per-class admission gauges and rejection counts in the Prometheus text format"""
+    lines: List[str] = []
+    for name, help_text, kind, value in (
+        ("admission_in_flight", "Admitted requests being served", "gauge", lambda limiter: limiter.in_flight),
+        ("admission_queued", "Requests waiting for a slot", "gauge", lambda limiter: limiter.queued),
+        ("admission_rejected_total", "Requests shed with 503", "counter", lambda limiter: limiter.rejected),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for route_class, limiter in sorted(limiters.items()):
+            lines.append(f"{name}{format_labels(route_class=route_class)} {value(limiter)}")
+    return "\n".join(lines) + "\n"
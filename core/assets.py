@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import logging
+import os
+import stat
+from typing import Callable, Dict, Optional, Set
+import anyio
+from fastapi.staticfiles import StaticFiles
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Scope
+from core.images import is_variant_url
+
+try:
+    import brotli
+except ImportError:  # optional: without it only .gz siblings are written
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = "static"
+URL_PREFIX = "/static"
+# Fingerprinted copies live here; everything under it is immutable
+DIST_DIR = "dist"
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt"}
+# Preferred order when a client accepts several encodings
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+_manifest: Dict[str, str] = {}
+
+def fingerprinted_name(name: str, data: bytes) -> str:
+    """css/style.css -> css/style.<hash>.css"""
+    root, ext = os.path.splitext(name)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+def _write_once(path: str, produce: Callable[[], bytes]):
+    """Write produce() atomically, skipping files a previous build (or another worker) already wrote.
+    
+    Taking a callable keeps the compression off warm starts, where every file exists.
+    """
+    if os.path.exists(path):
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(produce())
+    os.replace(tmp_path, path)
+
+def build_assets(static_dir: str = STATIC_DIR) -> Dict[str, str]:
+    """Write content-hashed copies of text assets plus .gz/.br siblings.
+    
+    Returns (and installs) the manifest mapping logical names to fingerprinted ones.
+    Idempotent: unchanged assets hash to files that already exist.
+    """
+    manifest = {}
+    dist_root = os.path.join(static_dir, DIST_DIR)
+    for directory, subdirs, files in os.walk(static_dir):
+        if os.path.abspath(directory) == os.path.abspath(static_dir):
+            subdirs[:] = [d for d in subdirs if d != DIST_DIR]
+        for filename in files:
+            if os.path.splitext(filename)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(directory, filename)
+            name = os.path.relpath(path, static_dir).replace(os.sep, "/")
+            with open(path, "rb") as f:
+                data = f.read()
+            hashed = fingerprinted_name(name, data)
+            target = os.path.join(dist_root, hashed)
+            try:
+                _write_once(target, lambda: data)
+                _write_once(target + ".gz", lambda: gzip.compress(data, compresslevel=9, mtime=0))
+                if brotli is not None:
+                    _write_once(target + ".br", lambda: brotli.compress(data, quality=11))
+            except OSError as e:
+                # Read-only or full disk: keep serving the original file
+                logger.warning("Could not fingerprint %s: %s", name, e)
+                continue
+            manifest[name] = f"{DIST_DIR}/{hashed}"
+    _manifest.clear()
+    _manifest.update(manifest)
+    return manifest
+
+def asset_url(name: str) -> str:
+    """URL for a logical asset name, fingerprinted when the build produced one"""
+    return f"{URL_PREFIX}/{_manifest.get(name, name)}"
+
+def _accepted_encodings(headers: Headers) -> Set[str]:
+    accepted = set()
+    for part in headers.get("accept-encoding", "").split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves prebuilt .br/.gz siblings and marks fingerprinted files immutable"""
+    
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await self._encoded_response(path, scope)
+        if response is None:
+            response = await super().get_response(path, scope)
+        if os.path.splitext(path)[1] in COMPRESSIBLE_EXTENSIONS:
+            response.headers["Vary"] = "Accept-Encoding"
+        if self._is_fingerprinted(path):
+            response.headers["Cache-Control"] = IMMUTABLE
+        return response
+    
+    async def _encoded_response(self, path: str, scope: Scope) -> Optional[Response]:
+        if scope["method"] not in ("GET", "HEAD") or os.path.splitext(path)[1] not in COMPRESSIBLE_EXTENSIONS:
+            return None
+        accepted = _accepted_encodings(Headers(scope=scope))
+        for encoding, suffix in ENCODINGS:
+            if encoding not in accepted:
+                continue
+            full_path, stat_result = await anyio.to_thread.run_sync(self.lookup_path, path + suffix)
+            if stat_result and stat.S_ISREG(stat_result.st_mode):
+                # Content-Type is guessed from the name minus the encoding suffix
+                response = self.file_response(full_path, stat_result, scope)
+                response.headers["Content-Encoding"] = encoding
+                return response
+        return None
+    
+    def _is_fingerprinted(self, path: str) -> bool:
+        path = path.replace(os.sep, "/")
+        return path.startswith(f"{DIST_DIR}/") or is_variant_url(f"{URL_PREFIX}/{path}")
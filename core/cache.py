@@ -0,0 +1,179 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+MISS = object()
+
+class TaggedCache:
+    """Bounded in-process cache with TTL + LRU eviction.
+    
+    Entries carry tags (a product, a category, a user...) so writes can
+    invalidate exactly the keys they affect.
+    """
+    
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any, Tuple]]" = OrderedDict()
+        self._tags: Dict[Hashable, Set[Hashable]] = {}
+        self._lock = threading.Lock()
+        # Advances on every invalidation, so a caller can tell whether one happened while it built a value
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value or the MISS sentinel"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return MISS
+            expires_at, value, _ = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return MISS
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key: Hashable, value: Any, tags: Iterable[Hashable] = (), ttl: Optional[float] = None,
+            generation: Optional[int] = None):
+        """Store a value under key, indexed by tags for invalidation.
+        
+        ttl can shorten (never extend) the cache-wide TTL for this entry. Pass
+        the generation read before building the value to skip storing it if an
+        invalidation has run since: the value may predate the write behind it.
+        """
+        tags = tuple(tags)
+        ttl = self.ttl_seconds if ttl is None else min(ttl, self.ttl_seconds)
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tags)
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+    
+    def invalidate(self, key: Hashable):
+        """Drop a single entry"""
+        with self._lock:
+            self.generation += 1
+            self._remove(key)
+    
+    def invalidate_tags(self, *tags: Hashable):
+        """Drop every entry carrying any of the given tags"""
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+    
+    def clear(self):
+        """Drop all entries"""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self._tags.clear()
+    
+    def stats(self) -> dict:
+        """Hit/miss counters and occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+    
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+class VersionStamp:
+    """Version counter for a data set, exposed as HTTP validators.
+    
+    The version is seeded from the process start time, so a restart (new code,
+    new templates) never reissues an ETag a client may hold for other content.
+    Workers forked from one preloaded process share that seed, so they number
+    versions by a shared, increasing id (the invalidation log's) instead of
+    counting locally: a respawned worker then carries on from the others
+    rather than starting over at 0.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._epoch = time.time_ns()
+        self._counter = 0
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        # The If-Modified-Since date a client must send to prove it has the current version
+        self.unchanged_since = self.last_modified
+    
+    @property
+    def etag(self) -> str:
+        return f'"{self.name}-{self._epoch:x}-{self._counter}"'
+    
+    def bump(self, version: Optional[int] = None):
+        """Mark the data set as changed, as of shared id version if given"""
+        with self._lock:
+            # Shared ids come from a log committed in id order, so an older one
+            # arriving late describes data this version already includes
+            self._counter = self._counter + 1 if version is None else max(self._counter, version)
+            # Last-Modified has one-second resolution and must never be in the future
+            # (RFC 9110 8.8.2.1). A second write within the same second can't move it,
+            # so a client holding that date may have the older version: until the next
+            # write, only the ETag can validate.
+            now = datetime.now(timezone.utc).replace(microsecond=0)
+            if now <= self.last_modified:
+                self.unchanged_since = self.last_modified + timedelta(seconds=1)
+            else:
+                self.last_modified = self.unchanged_since = now
+    
+    def headers(self) -> Dict[str, str]:
+        """ETag/Last-Modified for the current version; clients must revalidate before reuse"""
+        with self._lock:
+            return {
+                "ETag": self.etag,
+                "Last-Modified": format_datetime(self.last_modified, usegmt=True),
+                "Cache-Control": "no-cache",
+            }
+
+def not_modified(request_headers, etag: str, last_modified: datetime) -> bool:
+    """Whether a conditional GET can be answered with 304 Not Modified"""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present (RFC 9110 13.1.3)
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+    return False
@@ -1,21 +1,189 @@
-from sqlalchemy import create_engine
+from typing import Dict, Optional
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects import sqlite, postgresql
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from app.config import settings
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.database_url else {}
-)
+# Named engine tuning profiles, selected by settings.db_profile. SQLite gets
+# connection pragmas; server databases get connection pool sizing.
+ENGINE_PROFILES: Dict[str, Dict[str, dict]] = {
+    # Driver defaults: rollback journal, synchronous=FULL, no busy timeout
+    "default": {"sqlite_pragmas": {}, "pool": {}},
+    # WAL lets readers run alongside the single writer; NORMAL only fsyncs at checkpoints
+    "balanced": {
+        "sqlite_pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "cache_size": -16000,  # KiB
+            "temp_store": "MEMORY",
+            "mmap_size": 64 * 1024 * 1024,
+        },
+        "pool": {"pool_size": 5, "max_overflow": 10, "pool_pre_ping": True, "pool_recycle": 1800},
+    },
+    # Larger page cache and mmap window for read-heavy catalogs on roomier machines
+    "throughput": {
+        "sqlite_pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "NORMAL",
+            "busy_timeout": 5000,
+            "cache_size": -64000,
+            "temp_store": "MEMORY",
+            "mmap_size": 256 * 1024 * 1024,
+        },
+        "pool": {"pool_size": 20, "max_overflow": 20, "pool_pre_ping": True, "pool_recycle": 1800},
+    },
+    # WAL concurrency but an fsync on every commit
+    "durable": {
+        "sqlite_pragmas": {
+            "journal_mode": "WAL",
+            "synchronous": "FULL",
+            "busy_timeout": 10000,
+            "cache_size": -16000,
+            "temp_store": "MEMORY",
+        },
+        "pool": {"pool_size": 5, "max_overflow": 5, "pool_pre_ping": True, "pool_recycle": 1800},
+    },
+}
+
+def get_engine_profile(name: str) -> Dict[str, dict]:
+    if name not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown database profile '{name}'; expected one of: {', '.join(ENGINE_PROFILES)}")
+    return ENGINE_PROFILES[name]
+
+def is_sqlite(url: str) -> bool:
+    return url.split(":", 1)[0].split("+", 1)[0] == "sqlite"
+
+def engine_options(url: str, profile: str) -> dict:
+    """create_engine keyword arguments for a URL under a tuning profile"""
+    if is_sqlite(url):
+        # SQLite is tuned through pragmas instead of pool sizing
+        return {}
+    return dict(get_engine_profile(profile)["pool"])
+
+def apply_sqlite_pragmas(sync_engine: Engine, profile: str):
+    """Set the profile's pragmas on every new SQLite connection"""
+    pragmas = get_engine_profile(profile)["sqlite_pragmas"]
+    if not pragmas:
+        return
+
+    @event.listens_for(sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+def create_tuned_engine(url: str, profile: str) -> Engine:
+    """Sync engine for url with the profile's pool options or pragmas applied"""
+    if is_sqlite(url):
+        tuned = create_engine(url, connect_args={"check_same_thread": False})
+        apply_sqlite_pragmas(tuned, profile)
+    else:
+        tuned = create_engine(url, **engine_options(url, profile))
+    return tuned
+
+engine = create_tuned_engine(settings.database_url, settings.db_profile)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async drivers for the request path, derived from the sync URL unless overridden
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgres": "postgresql+asyncpg",
+}
+
+def get_async_database_url(url: str) -> str:
+    """Map a sync database URL onto its async driver"""
+    scheme, sep, rest = url.partition("://")
+    if "+" in scheme:
+        scheme = scheme.split("+", 1)[0]
+    if scheme not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for database URL scheme '{scheme}'")
+    return f"{ASYNC_DRIVERS[scheme]}{sep}{rest}"
+
+_async_url = settings.async_database_url or get_async_database_url(settings.database_url)
+async_engine = create_async_engine(_async_url, **engine_options(_async_url, settings.db_profile))
+if is_sqlite(_async_url):
+    apply_sqlite_pragmas(async_engine.sync_engine, settings.db_profile)
+
+# expire_on_commit=False: attributes must stay loaded after commit, since
+# touching an expired attribute outside the session would need blocking I/O
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession
+)
+
 Base = declarative_base()
 
+def sync_schema(bind, metadata):
+    """Create missing tables, plus the columns and indexes create_all skips on existing tables.
+    
+    Only nullable columns without a server default, and NOT NULL columns whose
+    constant server default fills in existing rows, are added; anything else
+    needs a real migration.
+    """
+    metadata.create_all(bind=bind)
+    inspector = inspect(bind)
+    for table in metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in columns:
+                continue
+            if column.nullable and column.server_default is None:
+                column_type = column.type.compile(dialect=bind.dialect)
+                with bind.begin() as conn:
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN "{column.name}" {column_type}'))
+            elif not column.nullable and isinstance(getattr(column.server_default, "arg", None), str):
+                definition = CreateColumn(column).compile(dialect=bind.dialect)
+                with bind.begin() as conn:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {definition}"))
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(bind=bind)
+
+def refresh_statistics(bind):
+    """Refresh SQLite planner statistics, sampling so it stays cheap on large tables.
+    
+    Without them SQLite guesses that an is_active index lookup is selective and
+    drives FTS searches from the products table, probing the index once per row.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    with bind.begin() as conn:
+        conn.exec_driver_sql("PRAGMA analysis_limit=1000")
+        conn.exec_driver_sql("ANALYZE")
+
+def upsert(dialect_name: str, table, index_elements, update_columns, extra_set: Optional[dict] = None):
+    """INSERT ... ON CONFLICT DO UPDATE for SQLite/PostgreSQL; works with executemany.
+    
+    extra_set adds fixed assignments to the update, e.g. an updated_at stamp.
+    """
+    if dialect_name == "sqlite":
+        stmt = sqlite.insert(table)
+    elif dialect_name == "postgresql":
+        stmt = postgresql.insert(table)
+    else:
+        raise NotImplementedError(f"Upsert is not supported on {dialect_name}")
+    return stmt.on_conflict_do_update(
+        index_elements=index_elements,
+        set_={**{column: stmt.excluded[column] for column in update_columns}, **(extra_set or {})}
+    )
+
 def get_db():
     """Database dependency"""
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+async def get_async_db():
+    """Async database dependency"""
+    async with AsyncSessionLocal() as db:
+        yield db
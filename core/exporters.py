@@ -0,0 +1,37 @@
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Iterable, Iterator, List, Sequence
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+def iter_export(fmt: str, columns: List[str], batches: Iterable[Sequence[tuple]]) -> Iterator[str]:
+    """Encode batches of row tuples as CSV or NDJSON, one chunk per batch"""
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(columns)
+        for batch in batches:
+            writer.writerows([[_plain(value) for value in row] for row in batch])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    elif fmt == "ndjson":
+        for batch in batches:
+            yield "".join(
+                json.dumps(dict(zip(columns, map(_plain, row))), separators=(",", ":")) + "\n"
+                for row in batch
+            )
+    else:
+        raise ValueError(f"Unsupported export format '{fmt}'")
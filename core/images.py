@@ -0,0 +1,189 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "static/images/products"
+URL_PREFIX = "/static/images/products"
+ALLOWED_EXTENSIONS = {"jpg", "jpeg", "png", "webp"}
+
+# Responsive widths; every width is written as JPEG and WebP
+VARIANT_WIDTHS = (320, 640, 960)
+VARIANT_FORMATS = ("jpg", "webp")
+PRIMARY_WIDTH = 960
+# Failed digests remembered for status(); in-flight jobs are dropped once they finish
+MAX_FAILED_JOBS = 1024
+
+_VARIANT_URL = re.compile(rf"^{re.escape(URL_PREFIX)}/(?P<digest>[0-9a-f]{{32}})-\d+\.(jpg|webp)$")
+
+def content_digest(data: bytes) -> str:
+    """Content address for an upload; identical bytes map to the same files"""
+    return hashlib.sha256(data).hexdigest()[:32]
+
+def variant_filename(digest: str, width: int, fmt: str) -> str:
+    return f"{digest}-{width}.{fmt}"
+
+def variant_url(digest: str, width: int = PRIMARY_WIDTH, fmt: str = "jpg") -> str:
+    return f"{URL_PREFIX}/{variant_filename(digest, width, fmt)}"
+
+def is_variant_url(url: str) -> bool:
+    """Whether a URL points at a content-addressed (never changing) variant"""
+    return bool(_VARIANT_URL.match(url))
+
+def image_srcset(image_url: Optional[str], fmt: str = "jpg") -> str:
+    """srcset for a processed upload, or "" for external/legacy image URLs"""
+    if not image_url:
+        return ""
+    match = _VARIANT_URL.match(image_url)
+    if not match:
+        return ""
+    digest = match.group("digest")
+    return ", ".join(f"{variant_url(digest, width, fmt)} {width}w" for width in VARIANT_WIDTHS)
+
+def process_image(data: bytes, digest: str, upload_dir: str = UPLOAD_DIR) -> Dict[str, str]:
+    """Decode once and write every missing width/format variant (runs in a worker process)"""
+    from PIL import Image
+
+    os.makedirs(upload_dir, exist_ok=True)
+    results = {}
+    with Image.open(io.BytesIO(data)) as source:
+        if source.mode != 'RGB':
+            source = source.convert('RGB')
+
+        for width in sorted(VARIANT_WIDTHS, reverse=True):
+            resized = None
+            for fmt in VARIANT_FORMATS:
+                filename = variant_filename(digest, width, fmt)
+                path = os.path.join(upload_dir, filename)
+                if not os.path.exists(path):
+                    if resized is None:
+                        resized = source.copy()
+                        resized.thumbnail((width, width), Image.Resampling.LANCZOS)
+                    # Write then rename so readers never see a partial file
+                    tmp_path = f"{path}.{os.getpid()}.tmp"
+                    if fmt == "webp":
+                        resized.save(tmp_path, "WEBP", quality=80, method=4)
+                    else:
+                        resized.save(tmp_path, "JPEG", optimize=True, quality=85, progressive=True)
+                    os.replace(tmp_path, path)
+                results[filename] = "ready"
+    return results
+
+class ImagePipeline:
+    """Processes uploads in a process pool, off the request path.
+
+    Uploads are content-addressed, so re-uploading an image that is already
+    processed (or in flight) reuses the existing files/job. Callers only link
+    an image once on_ready fires, so pages never point at a missing variant.
+    """
+
+    def __init__(self, workers: int, upload_dir: str = UPLOAD_DIR):
+        self.workers = workers
+        self.upload_dir = upload_dir
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # In-flight jobs only
+        self._jobs: Dict[str, Future] = {}
+        self._failed: "OrderedDict[str, None]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, data: bytes, filename: str, on_ready: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """Validate and queue an upload; returns its digest or None if it isn't a usable image.
+
+        on_ready(digest) runs once every variant is written: straight away when
+        they already are, otherwise in the pool's callback thread. It never
+        runs if processing fails.
+        """
+        extension = filename.rsplit('.', 1)[-1].lower() if filename and '.' in filename else ''
+        if extension not in ALLOWED_EXTENSIONS or not data:
+            return None
+        if not self._looks_like_image(data):
+            return None
+
+        digest = content_digest(data)
+        with self._lock:
+            future = self._jobs.get(digest)
+            if future is None and not all(os.path.exists(path) for path in self._variant_paths(digest)):
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                future = self._executor.submit(process_image, data, digest, self.upload_dir)
+                self._failed.pop(digest, None)
+                self._jobs[digest] = future
+                future.add_done_callback(lambda f, digest=digest: self._finished(digest, f))
+        if on_ready is not None:
+            if future is None:
+                self._notify(digest, None, on_ready)
+            else:
+                # Runs immediately if the job finished in the meantime
+                future.add_done_callback(lambda f: self._notify(digest, f, on_ready))
+        return digest
+
+    def status(self, digest: str) -> Dict[str, str]:
+        """Per-variant status: ready, pending, failed or missing"""
+        with self._lock:
+            job = self._jobs.get(digest)
+            failed = digest in self._failed
+        statuses = {}
+        for width in VARIANT_WIDTHS:
+            for fmt in VARIANT_FORMATS:
+                filename = variant_filename(digest, width, fmt)
+                if os.path.exists(os.path.join(self.upload_dir, filename)):
+                    statuses[filename] = "ready"
+                elif failed:
+                    statuses[filename] = "failed"
+                elif job is not None:
+                    statuses[filename] = "pending"
+                else:
+                    statuses[filename] = "missing"
+        return statuses
+
+    def shutdown(self):
+        """Stop the worker processes, letting queued jobs finish"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _variant_paths(self, digest: str) -> List[str]:
+        return [
+            os.path.join(self.upload_dir, variant_filename(digest, width, fmt))
+            for width in VARIANT_WIDTHS for fmt in VARIANT_FORMATS
+        ]
+
+    def _looks_like_image(self, data: bytes) -> bool:
+        # Image.open only parses the header, so this is cheap enough for the request path
+        from PIL import Image, UnidentifiedImageError
+        try:
+            with Image.open(io.BytesIO(data)) as img:
+                return img.format in ("JPEG", "PNG", "WEBP", "MPO")
+        except (UnidentifiedImageError, OSError):
+            return False
+
+    def _finished(self, digest: str, future: Future):
+        """Drop a finished job, remembering (a bounded number of) failures for status()"""
+        error = future.exception()
+        with self._lock:
+            if self._jobs.get(digest) is future:
+                del self._jobs[digest]
+            if error is not None:
+                self._failed[digest] = None
+                while len(self._failed) > MAX_FAILED_JOBS:
+                    self._failed.popitem(last=False)
+        if error is not None:
+            logger.error("Error processing image %s: %s", digest, error)
+
+    def _notify(self, digest: str, future: Optional[Future], on_ready: Callable[[str], None]):
+        if future is not None and future.exception() is not None:
+            return
+        try:
+            on_ready(digest)
+        except Exception:
+            logger.exception("Image %s is ready but its callback failed", digest)
+
+image_pipeline = ImagePipeline(settings.image_workers)
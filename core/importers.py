@@ -0,0 +1,78 @@
+import csv
+import io
+import json
+from typing import BinaryIO, Iterator, Optional, Tuple
+
+IMPORT_FORMATS = ("csv", "ndjson")
+
+_EXTENSIONS = {
+    "csv": "csv",
+    "ndjson": "ndjson",
+    "jsonl": "ndjson",
+}
+
+def import_format(filename: Optional[str]) -> Optional[str]:
+    """Infer the upload format from its extension"""
+    if not filename or "." not in filename:
+        return None
+    return _EXTENSIONS.get(filename.rsplit(".", 1)[-1].lower())
+
+def iter_rows(stream: BinaryIO, fmt: str) -> Iterator[Tuple[int, object]]:
+    """Yield (line number, row) from a CSV or NDJSON upload without reading it all in.
+    
+    CSV rows are dicts of strings with empty cells dropped, so they fall back to
+    model defaults. A row that isn't valid UTF-8, CSV or JSON is yielded as a
+    ValueError for the caller to report, and reading carries on with the next.
+    """
+    # Undecodable bytes become lone surrogates rather than failing the whole read
+    # mid-chunk, so they can be pinned to the row they're in
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", errors="surrogateescape", newline="")
+    try:
+        if fmt == "csv":
+            reader = csv.DictReader(text)
+            while True:
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    break
+                except csv.Error as e:
+                    # DictReader only copies line_num across after a successful read
+                    yield reader.reader.line_num, ValueError(f"Invalid CSV: {e}")
+                    continue
+                if not _is_valid_text(*row.keys(), *row.values()):
+                    yield reader.line_num, ValueError("Invalid UTF-8")
+                    continue
+                yield reader.line_num, {
+                    key.strip(): value for key, value in row.items()
+                    if key and value is not None and value.strip() != ""
+                }
+        elif fmt == "ndjson":
+            for line_num, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                if not _is_valid_text(line):
+                    yield line_num, ValueError("Invalid UTF-8")
+                    continue
+                try:
+                    yield line_num, json.loads(line)
+                except ValueError as e:
+                    yield line_num, ValueError(f"Invalid JSON: {e}")
+        else:
+            raise ValueError(f"Unsupported import format '{fmt}'")
+    finally:
+        # Leave the underlying upload open; the framework closes it
+        text.detach()
+
+def _is_valid_text(*values) -> bool:
+    """False if any string holds bytes surrogateescape couldn't decode"""
+    for value in values:
+        if isinstance(value, list):
+            # DictReader collects cells beyond the header under a None key
+            if not _is_valid_text(*value):
+                return False
+        elif isinstance(value, str):
+            try:
+                value.encode("utf-8")
+            except UnicodeEncodeError:
+                return False
+    return True
@@ -0,0 +1,194 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+class RequestStats:
+    """Database work done on behalf of the current request"""
+    __slots__ = ("queries", "db_seconds")
+    
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+
+# Set by MetricsMiddleware for the duration of a request. The stats object is
+# shared, not copied, so queries from threadpool workers and run_sync
+# greenlets (which inherit the context) all land on the same request.
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+class Histogram:
+    """Fixed-bucket histogram; observe() is a bisect and two adds"""
+    __slots__ = ("buckets", "counts", "sum")
+    
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+    
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+    
+    def cumulative(self) -> List[Tuple[str, int]]:
+        """(le, count) pairs in Prometheus order, ending with +Inf"""
+        bounds = [_format_number(bound) for bound in self.buckets] + ["+Inf"]
+        pairs, total = [], 0
+        for bound, count in zip(bounds, self.counts):
+            total += count
+            pairs.append((bound, total))
+        return pairs
+
+class RouteMetrics:
+    __slots__ = ("latency", "queries", "db_seconds", "statuses")
+    
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_COUNT_BUCKETS)
+        self.db_seconds = 0.0
+        self.statuses: Dict[int, int] = {}
+
+class MetricsRegistry:
+    """Per-route request metrics, rendered in the Prometheus text format.
+    
+    Routes are labelled by their path template, so /product/{product_id} is
+    one series no matter how many products get viewed.
+    """
+    
+    def __init__(self):
+        self._routes: Dict[Tuple[str, str], RouteMetrics] = {}
+        self._lock = threading.Lock()
+        self.in_progress = 0
+    
+    def observe(self, method: str, route: str, status: int, seconds: float, stats: RequestStats):
+        with self._lock:
+            metrics = self._routes.get((method, route))
+            if metrics is None:
+                metrics = self._routes[(method, route)] = RouteMetrics()
+            metrics.latency.observe(seconds)
+            metrics.queries.observe(stats.queries)
+            metrics.db_seconds += stats.db_seconds
+            metrics.statuses[status] = metrics.statuses.get(status, 0) + 1
+    
+    def render(self) -> str:
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = [
+                "# HELP http_requests_in_progress Requests currently being served",
+                "# TYPE http_requests_in_progress gauge",
+                f"http_requests_in_progress {self.in_progress}",
+                "# HELP http_requests_total Responses by route and status code",
+                "# TYPE http_requests_total counter",
+            ]
+            for (method, route), metrics in routes:
+                for status, count in sorted(metrics.statuses.items()):
+                    lines.append(f"http_requests_total{format_labels(method=method, route=route, status=status)} {count}")
+            _render_histogram(
+                lines, "http_request_duration_seconds", "Request latency by route",
+                [(key, metrics.latency) for key, metrics in routes]
+            )
+            _render_histogram(
+                lines, "http_request_db_queries", "Database queries issued per request",
+                [(key, metrics.queries) for key, metrics in routes]
+            )
+            lines += [
+                "# HELP http_request_db_seconds_total Time spent executing database queries",
+                "# TYPE http_request_db_seconds_total counter",
+            ]
+            for (method, route), metrics in routes:
+                lines.append(
+                    f"http_request_db_seconds_total{format_labels(method=method, route=route)} "
+                    f"{_format_number(metrics.db_seconds)}"
+                )
+        return "\n".join(lines) + "\n"
+
+def _render_histogram(lines: List[str], name: str, help_text: str, series):
+    lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    for (method, route), histogram in series:
+        for le, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{format_labels(method=method, route=route, le=le)} {count}")
+        lines.append(f"{name}_sum{format_labels(method=method, route=route)} {_format_number(histogram.sum)}")
+        lines.append(f"{name}_count{format_labels(method=method, route=route)} {sum(histogram.counts)}")
+
+def _format_number(value: float) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(**labels) -> str:
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def route_label(scope: Scope) -> str:
+    """The matched route's path template, read back after routing has filled in the scope"""
+    route = scope.get("route")
+    if route is not None:
+        return route.path
+    # Mounts (static files) only rewrite root_path
+    mount = scope.get("root_path", "")[len(scope.get("app_root_path", "")):]
+    if mount:
+        return f"{mount}/{{path}}"
+    return "<unmatched>"
+
+class MetricsMiddleware:
+    """Records latency, status and database work for every HTTP request"""
+    
+    def __init__(self, app: ASGIApp, registry: MetricsRegistry):
+        self.app = app
+        self.registry = registry
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+    
+        stats = RequestStats()
+        token = current_request.set(stats)
+        status = 500
+    
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+    
+        self.registry.in_progress += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.registry.in_progress -= 1
+            current_request.reset(token)
+            self.registry.observe(scope["method"], route_label(scope), status, elapsed, stats)
+
+def instrument_engine(sync_engine: Engine):
+    """Attribute each query's count and execution time to the request that issued it"""
+    
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def _start_timer(conn, cursor, statement, parameters, context, executemany):
+        if current_request.get() is not None:
+            conn.info.setdefault("query_started", []).append(time.perf_counter())
+    
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def _stop_timer(conn, cursor, statement, parameters, context, executemany):
+        stats = current_request.get()
+        started = conn.info.get("query_started")
+        if stats is None or not started:
+            return
+        stats.db_seconds += time.perf_counter() - started.pop()
+        stats.queries += 1
+    
+    @event.listens_for(sync_engine, "handle_error")
+    def _drop_timer(exception_context):
+        # Failed statements never reach after_cursor_execute
+        conn = exception_context.connection
+        started = conn.info.get("query_started") if conn is not None else None
+        if started and current_request.get() is not None:
+            started.pop()
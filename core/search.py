@@ -0,0 +1,105 @@
+import logging
+import re
+from typing import Optional
+from sqlalchemy import text, table, column, func, literal_column
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import OperationalError
+
+logger = logging.getLogger(__name__)
+
+# External-content FTS5 index over products(name, description). The triggers
+# keep it in sync with every INSERT/UPDATE/DELETE on the products table, so
+# ProductService.create_product/update_product need no extra bookkeeping.
+FTS_TABLE = "products_fts"
+
+_FTS_DDL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='products', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2',
+        prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END
+    """,
+]
+
+# Column weights for bm25(): a hit in the product name outranks one in the description
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+products_fts = table(FTS_TABLE, column("rowid"))
+
+_fts_available = False
+
+def ensure_search_index(engine: Engine, create: bool = True) -> bool:
+    """Create the FTS5 index and sync triggers, backfilling existing rows.
+    
+    With create=False only check that a previous migration created it.
+    """
+    global _fts_available
+    if engine.dialect.name != "sqlite":
+        _fts_available = False
+        return False
+
+    try:
+        with engine.begin() as conn:
+            exists = conn.execute(
+                text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                {"name": FTS_TABLE}
+            ).first()
+            if not create:
+                _fts_available = exists is not None
+                return _fts_available
+            for statement in _FTS_DDL:
+                conn.execute(text(statement))
+            if not exists:
+                # First run against an existing catalog: index what is already there
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"))
+    except OperationalError as e:
+        # SQLite builds without FTS5 fall back to LIKE scans
+        logger.warning("Full-text search unavailable, falling back to LIKE: %s", e)
+        _fts_available = False
+        return False
+
+    _fts_available = True
+    return True
+
+def fts_enabled() -> bool:
+    """Whether product search should go through the FTS5 index"""
+    return _fts_available
+
+def build_match_query(search: str) -> Optional[str]:
+    """Turn free text into an FTS5 MATCH expression with prefix matching on every term"""
+    terms = re.findall(r"\w+", search.lower())
+    if not terms:
+        return None
+    # Quote each term so FTS5 operators in user input are treated as plain text
+    return " ".join(f'"{term}"*' for term in terms)
+
+def match_clause(match_query: str):
+    """WHERE clause restricting rows to FTS matches"""
+    return literal_column(FTS_TABLE).match(match_query)
+
+def relevance():
+    """BM25 relevance expression (lower is better)"""
+    return func.bm25(literal_column(FTS_TABLE), NAME_WEIGHT, DESCRIPTION_WEIGHT)
@@ -1,21 +1,91 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from functools import lru_cache
+from typing import Optional, Tuple
 from app.config import settings
+from core.cache import TaggedCache, MISS
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# passlib and jose are imported on first use rather than at startup: together
+# they are most of this module's import time, and a cold start serving
+# anonymous catalog pages never needs them
+
+@lru_cache(maxsize=None)
+def get_pwd_context():
+    """The bcrypt CryptContext, built on first use.
+    
+    Pinning min/max rounds to the configured cost makes needs_update() true for
+    any stored hash with a different work factor, so logins rehash on change.
+    """
+    from passlib.context import CryptContext
+    return CryptContext(
+        schemes=["bcrypt"],
+        deprecated="auto",
+        bcrypt__default_rounds=settings.bcrypt_rounds,
+        bcrypt__min_rounds=settings.bcrypt_rounds,
+        bcrypt__max_rounds=settings.bcrypt_rounds,
+    )
+
+class PasswordHashingBusy(Exception):
+    """Raised when the password hashing pool has no room for more work"""
+
+class PasswordHasher:
+    """Runs bcrypt in a size-limited thread pool, off the event loop.
+    
+    bcrypt releases the GIL while hashing, so threads give real parallelism.
+    Work beyond workers + max_pending is rejected immediately instead of
+    queueing behind a login burst.
+    """
+    
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = workers
+        self.capacity = workers + max_pending
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hash")
+        self._lock = threading.Lock()
+        self._in_flight = 0
+    
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+    
+    async def run(self, fn, *args):
+        """Run fn(*args) in the pool, raising PasswordHashingBusy when saturated"""
+        with self._lock:
+            if self._in_flight >= self.capacity:
+                raise PasswordHashingBusy()
+            self._in_flight += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, fn, *args)
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+
+password_hasher = PasswordHasher(settings.password_hash_workers, settings.password_hash_max_pending)
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verify a password against its hash"""
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 def get_password_hash(password: str) -> str:
     """Hash a password"""
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """Verify a password in the hashing pool; returns (valid, new_hash) where
+    new_hash is set when the stored hash should be upgraded to the current cost"""
+    return await password_hasher.run(get_pwd_context().verify_and_update, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    """Hash a password in the hashing pool"""
+    return await password_hasher.run(get_pwd_context().hash, password)
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
+    from jose import jwt
+    
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
@@ -25,13 +95,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.secret_key, algorithm=settings.algorithm)
     return encoded_jwt
 
-def verify_token(token: str) -> Optional[str]:
-    """Verify JWT token and return username"""
+# Successfully decoded tokens -> (username, exp), kept no longer than the token is valid
+token_cache = TaggedCache(settings.principal_cache_size, settings.principal_cache_ttl_seconds)
+
+def decode_access_token(token: str) -> Optional[Tuple[str, float]]:
+    """Verify a JWT and return (username, exp timestamp), caching valid results"""
+    cached = token_cache.get(token)
+    if cached is not MISS:
+        return cached
+    
+    from jose import JWTError, jwt
     try:
         payload = jwt.decode(token, settings.secret_key, algorithms=[settings.algorithm])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        return username
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+    username = payload.get("sub")
+    expires_at = payload.get("exp")
+    if username is None or expires_at is None:
+        return None
+    
+    remaining = expires_at - time.time()
+    if remaining > 0:
+        token_cache.set(token, (username, expires_at), ttl=remaining)
+    return username, expires_at
+
+def verify_token(token: str) -> Optional[str]:
+    """Verify JWT token and return username"""
+    decoded = decode_access_token(token)
+    if decoded is None:
+        return None
+    return decoded[0]
@@ -1,39 +1,7 @@
 import os
 import uuid
-from PIL import Image
-from typing import Optional
-
-def save_uploaded_image(file, upload_dir: str = "static/images/products") -> Optional[str]:
-    """Save uploaded image and return filename"""
-    try:
-        # Create directory if it doesn't exist
-        os.makedirs(upload_dir, exist_ok=True)
-        
-        # Generate unique filename
-        file_extension = file.filename.split('.')[-1].lower()
-        if file_extension not in ['jpg', 'jpeg', 'png', 'webp']:
-            return None
-            
-        filename = f"{uuid.uuid4()}.{file_extension}"
-        file_path = os.path.join(upload_dir, filename)
-        
-        # Save and optimize image
-        with Image.open(file.file) as img:
-            # Convert to RGB if necessary
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # Resize if too large
-            max_size = (800, 800)
-            img.thumbnail(max_size, Image.Resampling.LANCZOS)
-            
-            # Save with optimization
-            img.save(file_path, optimize=True, quality=85)
-        
-        return filename
-    except Exception as e:
-        print(f"Error saving image: {e}")
-        return None
+import json
+import base64
 
 def format_currency(amount: float) -> str:
     """Format amount as currency"""
@@ -41,4 +9,20 @@ def format_currency(amount: float) -> str:
 
 def generate_order_number() -> str:
     """Generate unique order number"""
-    return f"ORD-{uuid.uuid4().hex[:8].upper()}"
\ No newline at end of file
+    return f"ORD-{uuid.uuid4().hex[:8].upper()}"
+
+def encode_cursor(sort: str, key, last_id: int) -> str:
+    """Encode a keyset pagination position as an opaque URL-safe token"""
+    raw = json.dumps([sort, key, last_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode a cursor token into (sort, key, last_id); raises ValueError if malformed"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort, key, last_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if not isinstance(sort, str) or not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return sort, key, last_id
\ No newline at end of file
@@ -0,0 +1,22 @@
+"""Gunicorn settings for multi-worker serving; main.py uses them when WORKERS > 1.
+
+    gunicorn app.main:app          # picks this file up from the working directory
+    kill -HUP <master pid>         # graceful restart: new workers start, old ones finish in-flight requests
+"""
+import os
+from app.config import settings
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+workers = settings.workers
+worker_class = "uvicorn.workers.UvicornWorker"
+# Import the app once in the master; workers fork from it and share its memory copy-on-write
+preload_app = True
+graceful_timeout = settings.worker_graceful_timeout
+timeout = settings.worker_graceful_timeout * 2
+loglevel = "info"
+
+def post_fork(server, worker):
+    """Drop pooled connections inherited from the master; a forked SQLite handle must not be reused"""
+    from core.database import async_engine, engine
+    engine.dispose(close=False)
+    async_engine.sync_engine.dispose(close=False)
@@ -1,10 +1,23 @@
 import os
+import sys
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
 if __name__ == "__main__":
+    from app.config import settings
+    
+    if settings.workers > 1:
+        # Migrate and seed once up front so the workers don't race each other doing it
+        if not settings.fast_start:
+            from app.bootstrap import migrate, seed
+            from core.database import engine
+            migrate(engine)
+            seed()
+            os.environ["FAST_START"] = "true"
+        os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app.main:app"])
+    
     import uvicorn
     from app.main import app
     
@@ -14,4 +27,4 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=port,
         log_level="info"
-    )
\ No newline at end of file
+    )
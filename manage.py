@@ -0,0 +1,55 @@
+"""Deploy-time commands, so the serving process can start with FAST_START=true.
+
+    python manage.py migrate       # create/upgrade tables, search index, planner stats
+    python manage.py seed          # sample catalog and admin user, if the catalog is empty
+    python manage.py build-assets  # fingerprinted and precompressed static files, compiled templates
+    python manage.py rebuild-recommendations  # "bought together" index from all order history
+"""
+import argparse
+
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+def migrate():
+    from app.bootstrap import migrate
+    from core.database import engine
+    migrate(engine)
+
+def seed():
+    from app.bootstrap import seed
+    seed()
+
+def build_assets():
+    from core.assets import build_assets
+    build_assets()
+    # Loading each template compiles it into the bytecode cache, so workers skip that on first render
+    from app.main import templates
+    for name in templates.env.list_templates():
+        templates.env.get_template(name)
+
+def rebuild_recommendations():
+    from core.database import SessionLocal
+    from services.business import RecommendationService
+    db = SessionLocal()
+    try:
+        print(f"{RecommendationService(db).rebuild()} products have recommendations")
+    finally:
+        db.close()
+
+COMMANDS = {
+    "migrate": migrate,
+    "seed": seed,
+    "build-assets": build_assets,
+    "rebuild-recommendations": rebuild_recommendations,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=list(COMMANDS))
+    args = parser.parse_args()
+    COMMANDS[args.command]()
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,9 @@
-from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, Boolean, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from core.database import Base
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Dict
 from datetime import datetime
 
 # SQLAlchemy Models
@@ -25,6 +25,7 @@ class Product(Base):
     __tablename__ = "products"
     
     id = Column(Integer, primary_key=True, index=True)
+    sku = Column(String, unique=True, index=True)
     name = Column(String, nullable=False, index=True)
     description = Column(Text)
     price = Column(Float, nullable=False)
@@ -34,18 +35,39 @@ class Product(Base):
     color = Column(String)
     image_url = Column(String)
     stock_quantity = Column(Integer, default=0)
+    # Sum of the product's inventory_holds; stock_quantity - reserved_quantity is what's left to sell
+    reserved_quantity = Column(Integer, nullable=False, default=0, server_default="0")
     is_featured = Column(Boolean, default=False)
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Client-side SQL defaults (not server_default) so sync_schema can add it to existing tables
+    updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now(), index=True)
+    # Incremented by every write to a ProductResponse field; keys the encoded-payload cache
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     
     order_items = relationship("OrderItem", back_populates="product")
+    
+    @property
+    def available_quantity(self) -> int:
+        """Stock not held in anyone's cart"""
+        return max((self.stock_quantity or 0) - (self.reserved_quantity or 0), 0)
+    
+    # Listing filters always include is_active; these let facet filters run off
+    # an index, and ix_products_active_facets covers the facet count scan
+    __table_args__ = (
+        Index("ix_products_active_category_price", "is_active", "category", "price"),
+        Index("ix_products_active_facets", "is_active", "category", "size", "color", "price"),
+        Index("ix_products_active_size", "is_active", "size"),
+        Index("ix_products_active_color", "is_active", "color"),
+        Index("ix_products_active_price", "is_active", "price"),
+    )
 
 class Order(Base):
     __tablename__ = "orders"
     
     id = Column(Integer, primary_key=True, index=True)
     order_number = Column(String, unique=True, nullable=False)
-    user_id = Column(Integer, ForeignKey("users.id"))
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
     total_amount = Column(Float, nullable=False)
     status = Column(String, default="pending")  # pending, confirmed, shipped, delivered, cancelled
     shipping_address = Column(Text)
@@ -56,12 +78,15 @@ class Order(Base):
     
     user = relationship("User", back_populates="orders")
     items = relationship("OrderItem", back_populates="order")
+    
+    # Fetch server defaults (created_at) with RETURNING on insert instead of a refresh
+    __mapper_args__ = {"eager_defaults": True}
 
 class OrderItem(Base):
     __tablename__ = "order_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer, nullable=False)
     price = Column(Float, nullable=False)  # Price at time of order
@@ -69,6 +94,71 @@ class OrderItem(Base):
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
 
+class OrderIdempotencyKey(Base):
+    __tablename__ = "order_idempotency_keys"
+    
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    key = Column(String, primary_key=True)
+    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Cart(Base):
+    __tablename__ = "carts"
+    
+    id = Column(String, primary_key=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    lines = relationship("CartLine", back_populates="cart", cascade="all, delete-orphan")
+
+class CartLine(Base):
+    __tablename__ = "cart_lines"
+    
+    cart_id = Column(String, ForeignKey("carts.id", ondelete="CASCADE"), primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    quantity = Column(Integer, nullable=False)
+    
+    cart = relationship("Cart", back_populates="lines")
+
+class InventoryHold(Base):
+    __tablename__ = "inventory_holds"
+    
+    # Stock set aside for a cart until expires_at; the sweeper gives expired holds back
+    cart_id = Column(String, primary_key=True)
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    quantity = Column(Integer, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    __table_args__ = (
+        Index("ix_inventory_holds_product_expiry", "product_id", "expires_at"),
+    )
+
+class ProductCopurchase(Base):
+    __tablename__ = "product_copurchases"
+    
+    # One row per direction, so a product's partners are a primary-key range scan
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    other_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    orders = Column(Integer, nullable=False, default=0)
+
+class ProductRecommendation(Base):
+    __tablename__ = "product_recommendations"
+    
+    product_id = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    # Top-K co-purchased products, best first, as "id:orders,id:orders"
+    neighbors = Column(Text, nullable=False, default="")
+
+class InvalidationEvent(Base):
+    __tablename__ = "invalidation_log"
+    
+    # AUTOINCREMENT: ids must never be reused after pruning, since workers read id > last seen
+    id = Column(Integer, primary_key=True)
+    origin = Column(String, nullable=False)
+    channel = Column(String, nullable=False)
+    payload = Column(Text, nullable=False, default="")
+    created_at = Column(DateTime, nullable=False, index=True)
+    
+    __table_args__ = {"sqlite_autoincrement": True}
+
 # Pydantic Models
 class UserCreate(BaseModel):
     email: str
@@ -88,6 +178,7 @@ class UserResponse(BaseModel):
         from_attributes = True
 
 class ProductCreate(BaseModel):
+    sku: Optional[str] = None
     name: str
     description: Optional[str] = None
     price: float
@@ -96,9 +187,11 @@ class ProductCreate(BaseModel):
     color: Optional[str] = None
     stock_quantity: int = 0
     is_featured: bool = False
+    image_url: Optional[str] = None
 
 class ProductResponse(BaseModel):
     id: int
+    sku: Optional[str] = None
     name: str
     description: Optional[str]
     price: float
@@ -115,6 +208,41 @@ class ProductResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class AdminProductResponse(ProductResponse):
+    image_status: Optional[Dict[str, str]] = None
+
+class ImportRowError(BaseModel):
+    line: int
+    errors: List[str]
+
+class ProductImportReport(BaseModel):
+    rows: int
+    imported: int
+    error_count: int
+    errors: List[ImportRowError]
+
+class FacetCount(BaseModel):
+    value: str
+    count: int
+
+class ProductFacets(BaseModel):
+    category: List[FacetCount]
+    size: List[FacetCount]
+    color: List[FacetCount]
+    price: List[FacetCount]
+
+class ProductCursorPage(BaseModel):
+    items: List[ProductResponse]
+    next_cursor: Optional[str] = None
+    total: int
+    facets: Optional[ProductFacets] = None
+
+class ProductFacetPage(BaseModel):
+    items: List[ProductResponse]
+    page: int
+    total_pages: int
+    facets: ProductFacets
+
 class CartItem(BaseModel):
     product_id: int
     quantity: int
@@ -129,17 +257,40 @@ class OrderCreate(BaseModel):
     billing_address: str
     payment_method: str
 
+class OrderProductSummary(BaseModel):
+    id: int
+    name: str
+    image_url: Optional[str]
+    
+    class Config:
+        from_attributes = True
+
+class OrderItemResponse(BaseModel):
+    product_id: int
+    quantity: int
+    price: float
+    product: Optional[OrderProductSummary] = None
+    
+    class Config:
+        from_attributes = True
+
 class OrderResponse(BaseModel):
     id: int
     order_number: str
     total_amount: float
     status: str
     created_at: datetime
-    items: List[dict]
+    items: List[OrderItemResponse]
     
     class Config:
         from_attributes = True
 
+class OrderHistoryPage(BaseModel):
+    items: List[OrderResponse]
+    page: int
+    per_page: int
+    has_next: bool
+
 class Token(BaseModel):
     access_token: str
     token_type: str
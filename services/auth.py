@@ -1,14 +1,69 @@
+import time
 from datetime import timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
-from core.database import get_db
-from core.security import verify_password, get_password_hash, create_access_token, verify_token
+from sqlalchemy import select, event, inspect
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import get_async_db
+from core.security import (
+    verify_password, get_password_hash, create_access_token, decode_access_token,
+    verify_password_async, get_password_hash_async, PasswordHashingBusy
+)
 from models.schemas import User, UserCreate
 from app.config import settings
+from core.cache import TaggedCache, MISS
+from services.invalidation import invalidation_bus
 
 security = HTTPBearer()
 
+# Authenticated users by bearer token. Entries never outlive the token's exp and
+# are tagged by username so changes to the user drop every token's entry.
+principal_cache = TaggedCache(settings.principal_cache_size, settings.principal_cache_ttl_seconds)
+
+def user_tag(username: str) -> tuple:
+    return ("user", username)
+
+# invalidation_bus channel; payload is a username
+USER_CHANNEL = "user"
+
+def invalidate_user_principals(username: str):
+    """Drop cached principals for a user"""
+    principal_cache.invalidate_tags(user_tag(username))
+
+invalidation_bus.subscribe(USER_CHANNEL, invalidate_user_principals)
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    """Deactivation, admin-flag and other user changes must not be served from cache"""
+    # A rename leaves entries tagged with the old username
+    usernames = [target.username, *inspect(target).attrs.username.history.deleted]
+    for username in usernames:
+        invalidate_user_principals(username)
+        invalidation_bus.publish(connection, USER_CHANNEL, username)
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("changed_users", set()).update(usernames)
+
+@event.listens_for(Session, "after_commit")
+def _user_changes_committed(session):
+    """Invalidate again once the change is visible: a request may have read the old row since the flush"""
+    for username in session.info.pop("changed_users", ()):
+        invalidate_user_principals(username)
+
+@event.listens_for(Session, "after_rollback")
+def _user_changes_rolled_back(session):
+    session.info.pop("changed_users", None)
+
+def _hashing_unavailable():
+    """Fast 503 for when the password hashing pool is saturated"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Authentication is busy, please retry shortly",
+        headers={"Retry-After": "1"},
+    )
+
 def authenticate_user(db: Session, username: str, password: str):
     """Authenticate user with username/email and password"""
     user = db.query(User).filter(
@@ -19,6 +74,28 @@ def authenticate_user(db: Session, username: str, password: str):
         return False
     return user
 
+async def authenticate_user_async(db: AsyncSession, username: str, password: str):
+    """Authenticate user with username/email and password"""
+    result = await db.execute(
+        select(User).where((User.username == username) | (User.email == username))
+    )
+    user = result.scalars().first()
+    if not user:
+        return False
+    
+    try:
+        valid, new_hash = await verify_password_async(password, user.hashed_password)
+    except PasswordHashingBusy:
+        raise _hashing_unavailable()
+    if not valid:
+        return False
+    
+    if new_hash:
+        # Stored hash predates the configured bcrypt cost; upgrade it now that we have the password
+        user.hashed_password = new_hash
+        await db.commit()
+    return user
+
 def create_user(db: Session, user: UserCreate):
     """Create new user"""
     # Check if user already exists
@@ -44,9 +121,35 @@ def create_user(db: Session, user: UserCreate):
     db.refresh(db_user)
     return db_user
 
-def get_current_user(
+async def create_user_async(db: AsyncSession, user: UserCreate):
+    """Create new user"""
+    result = await db.execute(
+        select(User).where((User.email == user.email) | (User.username == user.username))
+    )
+    if result.scalars().first():
+        raise HTTPException(
+            status_code=400,
+            detail="Email or username already registered"
+        )
+    
+    try:
+        hashed_password = await get_password_hash_async(user.password)
+    except PasswordHashingBusy:
+        raise _hashing_unavailable()
+    db_user = User(
+        email=user.email,
+        username=user.username,
+        hashed_password=hashed_password,
+        full_name=user.full_name
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Get current authenticated user"""
     credentials_exception = HTTPException(
@@ -55,14 +158,28 @@ def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     
-    username = verify_token(credentials.credentials)
-    if username is None:
+    token = credentials.credentials
+    # Read before the user row: a change committed while it loads must not leave the old row cached
+    generation = principal_cache.generation
+    user = principal_cache.get(token)
+    if user is not MISS:
+        return user
+    
+    decoded = decode_access_token(token)
+    if decoded is None:
         raise credentials_exception
+    username, expires_at = decoded
     
-    user = db.query(User).filter(User.username == username).first()
+    result = await db.execute(select(User).where(User.username == username))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
     
+    remaining = expires_at - time.time()
+    if remaining > 0:
+        # Detach so the cached instance stays readable after this session closes
+        db.expunge(user)
+        principal_cache.set(token, user, tags=(user_tag(username),), ttl=remaining, generation=generation)
     return user
 
 def get_current_active_user(current_user: User = Depends(get_current_user)):
@@ -83,6 +200,15 @@ def get_current_admin_user(current_user: User = Depends(get_current_active_user)
 def login_for_access_token(db: Session, username: str, password: str):
     """Login and return access token"""
     user = authenticate_user(db, username, password)
+    return _issue_access_token(user)
+
+async def login_for_access_token_async(db: AsyncSession, username: str, password: str):
+    """Login and return access token"""
+    user = await authenticate_user_async(db, username, password)
+    return _issue_access_token(user)
+
+def _issue_access_token(user):
+    """Build the token response for an authenticated user"""
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -1,9 +1,173 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
-from typing import List, Optional, Tuple
-from models.schemas import Product, User, Order, OrderItem, ProductCreate
-from core.utils import generate_order_number
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, false, func, tuple_, select, delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from itsdangerous import Signer, BadSignature
+from fastapi import HTTPException, Request, Response
+from models.schemas import (
+    Product, User, Order, OrderItem, OrderIdempotencyKey, ProductCreate, Cart, CartLine, InventoryHold,
+    ImportRowError, ProductImportReport, ProductCopurchase, ProductRecommendation, ProductResponse
+)
+from pydantic import ValidationError
+from core.database import refresh_statistics, upsert
+from core.utils import generate_order_number, encode_cursor, decode_cursor
+from core.importers import iter_rows
+from core import search as product_search
+from core.cache import TaggedCache, VersionStamp, MISS, not_modified
+from services.invalidation import invalidation_bus
+from app.config import settings
+import json
 import math
+import orjson
+import secrets
+
+# Catalog reads served from memory; writes invalidate by tag
+catalog_cache = TaggedCache(settings.catalog_cache_size, settings.catalog_cache_ttl_seconds)
+
+# Cache tags
+FEATURED_TAG = "featured"
+CATEGORIES_TAG = "categories"
+COUNTS_TAG = "counts"
+
+# Rendered storefront HTML, keyed by route + normalized params; dropped on any catalog write
+page_cache = TaggedCache(settings.page_cache_size, settings.page_cache_ttl_seconds)
+
+# Bumped on every catalog write; drives ETag/Last-Modified on catalog pages
+catalog_version = VersionStamp("catalog")
+
+# Encoded ProductResponse JSON per (product id, row version). A write bumps the
+# row's version, so a listing built from fresh rows never picks up a stale
+# fragment, in this worker or any other, and nothing needs invalidating.
+product_fragments = TaggedCache(settings.product_fragment_cache_size, settings.product_fragment_ttl_seconds)
+PRODUCT_RESPONSE_FIELDS = tuple(ProductResponse.model_fields)
+
+def product_json(product: Product) -> bytes:
+    """ProductResponse JSON for a row, encoded once per version"""
+    key = (product.id, product.version)
+    fragment = product_fragments.get(key)
+    if fragment is MISS:
+        # Plain attribute reads: the row already has ProductResponse's shape
+        fragment = orjson.dumps({field: getattr(product, field) for field in PRODUCT_RESPONSE_FIELDS})
+        product_fragments.set(key, fragment)
+    return fragment
+
+def products_json(products: Iterable[Product]) -> bytes:
+    """JSON array of ProductResponse, concatenated from cached fragments"""
+    return b"[" + b",".join(product_json(product) for product in products) + b"]"
+
+def json_envelope(items: bytes, **fields) -> bytes:
+    """JSON object with an already-encoded "items" member ahead of the other fields"""
+    rest = orjson.dumps(fields)
+    return b'{"items":' + items + (b"," + rest[1:] if fields else b"}")
+
+# invalidation_bus channels; payloads are JSON catalog tags / a cart id / JSON product ids
+CATALOG_CHANNEL = "catalog"
+CART_CHANNEL = "cart"
+STOCK_CHANNEL = "stock"
+
+def invalidate_catalog(tags: Optional[List] = None, version: Optional[int] = None):
+    """Drop catalog entries carrying any of tags (every entry when None), rendered pages, and bump the version.
+    
+    version is the log id the change was published under, when there is one.
+    """
+    if tags is None:
+        catalog_cache.clear()
+    else:
+        catalog_cache.invalidate_tags(*tags)
+    page_cache.clear()
+    catalog_version.bump(version)
+
+def _catalog_invalidated(payload: str):
+    tags = json.loads(payload)
+    # JSON turns tuple tags into lists
+    tags = None if tags is None else [tuple(tag) if isinstance(tag, list) else tag for tag in tags]
+    invalidate_catalog(tags, invalidation_bus.last_id)
+
+invalidation_bus.subscribe(CATALOG_CHANNEL, _catalog_invalidated)
+
+def invalidate_stock(product_ids: Iterable[int], version: Optional[int] = None):
+    """Drop the cached products and rendered pages that show these products' stock, and bump the version.
+    
+    Stock moves with every cart hold and sale, so unlike other catalog writes
+    this leaves the rest of the page cache alone; the version still moves, as
+    the pages showing the stock now have different content under the same URL.
+    """
+    tags = [product_tag(product_id) for product_id in product_ids]
+    if tags:
+        catalog_cache.invalidate_tags(*tags)
+        page_cache.invalidate_tags(*tags)
+        catalog_version.bump(version)
+
+invalidation_bus.subscribe(
+    STOCK_CHANNEL, lambda payload: invalidate_stock(json.loads(payload), invalidation_bus.last_id)
+)
+
+def catalog_validators(request: Request, response: Response) -> Dict[str, str]:
+    """Dependency: catalog validators, answering 304 before the handler touches the DB"""
+    headers = catalog_version.headers()
+    if not_modified(request.headers, headers["ETag"], catalog_version.unchanged_since):
+        raise HTTPException(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return headers
+
+def product_tag(product_id: int) -> tuple:
+    return ("product", product_id)
+
+def category_tag(category: str) -> tuple:
+    return ("category", category)
+
+# Sort options for listings: name -> (column, descending)
+SORT_OPTIONS = {
+    "id": (Product.id, False),
+    "price": (Product.price, False),
+    "-price": (Product.price, True),
+    "name": (Product.name, False),
+}
+RELEVANCE_SORT = "relevance"
+
+@dataclass(frozen=True)
+class FacetFilter:
+    """Facet selections on a listing: any of the sizes, any of the colors, a price range.
+    
+    min_price is inclusive and max_price exclusive, matching PRICE_BUCKETS.
+    """
+    sizes: Tuple[str, ...] = ()
+    colors: Tuple[str, ...] = ()
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    
+    @classmethod
+    def create(cls, sizes: Iterable[str] = (), colors: Iterable[str] = (),
+               min_price: Optional[float] = None, max_price: Optional[float] = None) -> "FacetFilter":
+        """Normalized filter, so equivalent selections share cache keys"""
+        return cls(
+            sizes=tuple(sorted({size.strip() for size in sizes if size and size.strip()})),
+            colors=tuple(sorted({color.strip() for color in colors if color and color.strip()})),
+            min_price=min_price,
+            max_price=max_price,
+        )
+
+NO_FACETS = FacetFilter()
+
+# Price facet buckets: [lower, upper) with an open-ended last bucket
+PRICE_BUCKETS = (0, 50, 100, 150, 200)
+FACET_NAMES = ("category", "size", "color", "price")
+
+def price_bucket_label(lower: float, upper: Optional[float]) -> str:
+    return f"{lower:g}-{upper:g}" if upper is not None else f"{lower:g}+"
+
+def parse_price_bucket(label: Optional[str]) -> Tuple[Optional[float], Optional[float]]:
+    """Inverse of price_bucket_label; (None, None) for anything unrecognized"""
+    for lower, upper in zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + (None,)):
+        if label == price_bucket_label(lower, upper):
+            return float(lower), float(upper) if upper is not None else None
+    return None, None
+
+# Columns available to the catalog export
+PRODUCT_COLUMNS = tuple(column.name for column in Product.__table__.columns)
 
 class ProductService:
     def __init__(self, db: Session):
@@ -14,113 +178,1133 @@ class ProductService:
         category: Optional[str] = None, 
         search: Optional[str] = None,
         page: int = 1,
-        per_page: int = 12
+        per_page: int = 12,
+        sort: Optional[str] = None,
+        facets: FacetFilter = NO_FACETS
     ) -> Tuple[List[Product], int]:
         """Get paginated products with optional filtering"""
+        query, ranked = self._filtered_query(category, search, facets)
+        
+        total_count = self.count_products(category=category, search=search, facets=facets)
+        total_pages = math.ceil(total_count / per_page)
+        
+        sort_key, descending = self._sort_key(sort, ranked)
+        query = self._order(query, sort_key, descending)
+        
+        products = query.offset((page - 1) * per_page).limit(per_page).all()
+        
+        return products, total_pages
+    
+    def get_products_after(
+        self,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        cursor: Optional[str] = None,
+        per_page: int = 12,
+        sort: Optional[str] = None,
+        facets: FacetFilter = NO_FACETS
+    ) -> Tuple[List[Product], Optional[str]]:
+        """Get a page of products by seeking past the cursor on (sort_key, id)"""
+        query, ranked = self._filtered_query(category, search, facets)
+        sort_key, descending = self._sort_key(sort, ranked)
+        sort_name = sort or (RELEVANCE_SORT if ranked else "id")
+        
+        if cursor:
+            cursor_sort, last_key, last_id = decode_cursor(cursor)
+            if cursor_sort != sort_name:
+                raise ValueError("Cursor does not match the requested sort order")
+            position = tuple_(sort_key, Product.id)
+            query = query.filter(
+                position < (last_key, last_id) if descending else position > (last_key, last_id)
+            )
+        
+        query = self._order(query, sort_key, descending)
+        if ranked and sort_name == RELEVANCE_SORT:
+            rows = query.add_columns(sort_key).limit(per_page + 1).all()
+            products = [row[0] for row in rows]
+            keys = [row[1] for row in rows]
+        else:
+            products = query.limit(per_page + 1).all()
+            keys = [getattr(product, sort_key.key) for product in products]
+        
+        next_cursor = None
+        if len(products) > per_page:
+            products = products[:per_page]
+            last = products[-1]
+            next_cursor = encode_cursor(sort_name, keys[per_page - 1], last.id)
+        
+        return products, next_cursor
+    
+    def count_products(
+        self,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        facets: FacetFilter = NO_FACETS
+    ) -> int:
+        """Count active products matching the filters, served from the catalog cache"""
+        key = ("count", category or None, (search or "").strip().lower() or None, facets)
+        generation = catalog_cache.generation
+        total_count = catalog_cache.get(key)
+        if total_count is not MISS:
+            return total_count
+        
+        query, _ = self._filtered_query(category, search, facets)
+        total_count = query.order_by(None).count()
+        # Any write can move rows between filters, so counts share one tag
+        catalog_cache.set(key, total_count, tags=(COUNTS_TAG,), generation=generation)
+        return total_count
+    
+    def get_facet_counts(
+        self,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        facets: FacetFilter = NO_FACETS
+    ) -> Dict[str, List[Tuple[str, int]]]:
+        """Per-facet (value, count) pairs for a listing.
+        
+        Each facet is counted with every filter applied except its own, so a
+        shopper who picked size 9 still sees how many products come in 10.
+        """
+        search_key = (search or "").strip().lower() or None
+        key = ("facets", category or None, search_key, facets)
+        generation = catalog_cache.generation
+        counts = catalog_cache.get(key)
+        if counts is not MISS:
+            return counts
+        
+        filtered = self._facet_cube(search, facets.min_price, facets.max_price)
+        unpriced = filtered
+        if facets.min_price is not None or facets.max_price is not None:
+            unpriced = self._facet_cube(search, None, None)
+        
+        tallies = {name: {} for name in FACET_NAMES}
+        
+        def tally(name, value, count):
+            if value:
+                tallies[name][value] = tallies[name].get(value, 0) + count
+        
+        bucket_labels = [
+            price_bucket_label(lower, upper) for lower, upper in zip(PRICE_BUCKETS, PRICE_BUCKETS[1:] + (None,))
+        ]
+        for row_category, size, color, buckets in filtered:
+            count = sum(buckets)
+            in_category = not category or row_category == category
+            in_size = not facets.sizes or size in facets.sizes
+            in_color = not facets.colors or color in facets.colors
+            if in_size and in_color:
+                tally("category", row_category, count)
+            if in_category and in_color:
+                tally("size", size, count)
+            if in_category and in_size:
+                tally("color", color, count)
+        for row_category, size, color, buckets in unpriced:
+            if (not category or row_category == category) and (not facets.sizes or size in facets.sizes) \
+                    and (not facets.colors or color in facets.colors):
+                for label, count in zip(bucket_labels, buckets):
+                    tally("price", label, count)
+        
+        counts = {name: sorted(values.items()) for name, values in tallies.items()}
+        counts["price"] = [(label, tallies["price"][label]) for label in bucket_labels if tallies["price"].get(label)]
+        catalog_cache.set(key, counts, tags=(COUNTS_TAG,), generation=generation)
+        return counts
+    
+    def _facet_cube(
+        self,
+        search: Optional[str],
+        min_price: Optional[float],
+        max_price: Optional[float]
+    ) -> List[Tuple[str, str, str, Tuple[int, ...]]]:
+        """Active-product counts per (category, size, color), split by price bucket.
+        
+        One grouped index scan per search term and price range; category, size
+        and color selections are applied to the (small) result in Python, so
+        every combination of them shares the cached cube.
+        """
+        key = ("facet_cube", (search or "").strip().lower() or None, min_price, max_price)
+        generation = catalog_cache.generation
+        cube = catalog_cache.get(key)
+        if cube is not MISS:
+            return cube
+        
+        # Cumulative "price < edge" counts let SQLite aggregate in index order
+        # without a temp b-tree; buckets are the differences
+        below = [func.count().filter(Product.price < edge) for edge in PRICE_BUCKETS[1:]]
+        query, _ = self._filtered_query(None, search, FacetFilter(min_price=min_price, max_price=max_price))
+        rows = query.with_entities(
+            Product.category, Product.size, Product.color, *below, func.count()
+        ).group_by(Product.category, Product.size, Product.color).all()
+        
+        cube = []
+        for row_category, size, color, *cumulative in rows:
+            buckets = tuple(upper - lower for lower, upper in zip([0] + cumulative, cumulative))
+            cube.append((row_category, size, color, buckets))
+        catalog_cache.set(key, cube, tags=(COUNTS_TAG,), generation=generation)
+        return cube
+    
+    def _filtered_query(
+        self,
+        category: Optional[str],
+        search: Optional[str],
+        facets: FacetFilter = NO_FACETS
+    ):
+        """Base listing query for active products; returns (query, ranked)"""
         query = self.db.query(Product).filter(Product.is_active == True)
         
         if category:
             query = query.filter(Product.category == category)
+        if facets.sizes:
+            query = query.filter(Product.size.in_(facets.sizes))
+        if facets.colors:
+            query = query.filter(Product.color.in_(facets.colors))
+        if facets.min_price is not None:
+            query = query.filter(Product.price >= facets.min_price)
+        if facets.max_price is not None:
+            query = query.filter(Product.price < facets.max_price)
         
+        ranked = False
         if search:
-            query = query.filter(
-                or_(
-                    Product.name.contains(search),
-                    Product.description.contains(search)
-                )
-            )
-        
-        total_count = query.count()
-        total_pages = math.ceil(total_count / per_page)
+            query, ranked = self._apply_search(query, search)
         
-        products = query.offset((page - 1) * per_page).limit(per_page).all()
+        return query, ranked
+    
+    def _sort_key(self, sort: Optional[str], ranked: bool):
+        """Resolve a sort option to (expression, descending)"""
+        if sort is None:
+            sort = RELEVANCE_SORT if ranked else "id"
+        if sort == RELEVANCE_SORT:
+            if not ranked:
+                raise ValueError("Relevance sort requires a search term")
+            return product_search.relevance(), False
+        if sort not in SORT_OPTIONS:
+            raise ValueError(f"Unknown sort option: {sort}")
+        return SORT_OPTIONS[sort]
+    
+    def _order(self, query, sort_key, descending: bool):
+        """Order by the sort key with id as the tiebreaker"""
+        if descending:
+            return query.order_by(sort_key.desc(), Product.id.desc())
+        return query.order_by(sort_key, Product.id)
+    
+    def _apply_search(self, query, search: str):
+        """Restrict query to search matches; returns (query, ranked)"""
+        if product_search.fts_enabled():
+            match_query = product_search.build_match_query(search)
+            if match_query is None:
+                return query.filter(false()), False
+            query = query.join(
+                product_search.products_fts,
+                product_search.products_fts.c.rowid == Product.id
+            ).filter(product_search.match_clause(match_query))
+            return query, True
         
-        return products, total_pages
+        query = query.filter(
+            or_(
+                Product.name.contains(search),
+                Product.description.contains(search)
+            )
+        )
+        return query, False
     
     def get_featured_products(self, limit: int = 8) -> List[Product]:
         """Get featured products"""
-        return self.db.query(Product).filter(
-            and_(Product.is_featured == True, Product.is_active == True)
-        ).limit(limit).all()
+        key = ("featured", limit)
+        generation = catalog_cache.generation
+        products = catalog_cache.get(key)
+        if products is MISS:
+            products = self.db.query(Product).filter(
+                and_(Product.is_featured == True, Product.is_active == True)
+            ).limit(limit).all()
+            tags = [FEATURED_TAG] + [product_tag(product.id) for product in products]
+            catalog_cache.set(key, self._detach(products), tags=tags, generation=generation)
+        return list(products)
     
     def get_product_by_id(self, product_id: int) -> Optional[Product]:
         """Get product by ID"""
-        return self.db.query(Product).filter(
-            and_(Product.id == product_id, Product.is_active == True)
-        ).first()
+        key = ("product", product_id)
+        generation = catalog_cache.generation
+        product = catalog_cache.get(key)
+        if product is MISS:
+            product = self.db.query(Product).filter(
+                and_(Product.id == product_id, Product.is_active == True)
+            ).first()
+            if product is not None:
+                self._detach([product])
+            catalog_cache.set(key, product, tags=(product_tag(product_id),), generation=generation)
+        return product
     
     def get_related_products(self, category: str, exclude_id: int, limit: int = 4) -> List[Product]:
-        """Get related products by category"""
-        return self.db.query(Product).filter(
-            and_(
-                Product.category == category,
-                Product.id != exclude_id,
-                Product.is_active == True
+        """Get products often bought with exclude_id, topped up from its category"""
+        key = ("related", category, exclude_id, limit)
+        generation = catalog_cache.generation
+        products = catalog_cache.get(key)
+        if products is MISS:
+            products = self._bought_together(exclude_id, limit)
+            if len(products) < limit:
+                seen = [exclude_id] + [product.id for product in products]
+                products += self.db.query(Product).filter(
+                    and_(
+                        Product.category == category,
+                        Product.id.notin_(seen),
+                        Product.is_active == True
+                    )
+                ).limit(limit - len(products)).all()
+            # Also tagged with exclude_id's own product: its neighbours and category change with it
+            tags = [category_tag(category), product_tag(exclude_id)] + [product_tag(product.id) for product in products]
+            catalog_cache.set(key, self._detach(products), tags=tags, generation=generation)
+        return list(products)
+    
+    def _bought_together(self, product_id: int, limit: int) -> List[Product]:
+        """Active products from the precomputed top-K list, in rank order: two primary-key lookups"""
+        neighbor_ids = RecommendationService(self.db).neighbors(product_id)
+        if not neighbor_ids:
+            return []
+        by_id = {
+            product.id: product
+            for product in self.db.query(Product).filter(
+                and_(Product.id.in_(neighbor_ids), Product.is_active == True)
             )
-        ).limit(limit).all()
+        }
+        return [by_id[neighbor_id] for neighbor_id in neighbor_ids if neighbor_id in by_id][:limit]
     
     def get_categories(self) -> List[str]:
         """Get all product categories"""
-        categories = self.db.query(Product.category).filter(
-            Product.is_active == True
-        ).distinct().all()
-        return [cat[0] for cat in categories]
+        key = ("categories",)
+        generation = catalog_cache.generation
+        categories = catalog_cache.get(key)
+        if categories is MISS:
+            rows = self.db.query(Product.category).filter(
+                Product.is_active == True
+            ).distinct().all()
+            categories = [cat[0] for cat in rows]
+            catalog_cache.set(key, categories, tags=(CATEGORIES_TAG,), generation=generation)
+        return list(categories)
     
     def create_product(self, product_data: ProductCreate) -> Product:
         """Create new product"""
         product = Product(**product_data.dict())
         self.db.add(product)
+        self.db.flush()
+        tags = self._invalidation_tags(product.id, {product.category}, featured=bool(product.is_featured), categories=True)
+        version = invalidation_bus.publish(self.db, CATALOG_CHANNEL, json.dumps(tags))
         self.db.commit()
         self.db.refresh(product)
+        invalidate_catalog(tags, version)
         return product
     
     def update_product(self, product_id: int, product_data: dict) -> Optional[Product]:
         """Update product"""
         product = self.db.query(Product).filter(Product.id == product_id).first()
         if product:
+            old_category = product.category
+            old_featured = bool(product.is_featured)
+            old_active = bool(product.is_active)
             for key, value in product_data.items():
                 setattr(product, key, value)
+            product.version = Product.version + 1
+            tags = self._invalidation_tags(
+                product.id,
+                {old_category, product.category},
+                featured=old_featured or bool(product.is_featured),
+                categories=old_category != product.category or old_active != bool(product.is_active)
+            )
+            # In the same transaction, so other workers can't see the new row before the invalidation
+            version = invalidation_bus.publish(self.db, CATALOG_CHANNEL, json.dumps(tags))
             self.db.commit()
             self.db.refresh(product)
+            invalidate_catalog(tags, version)
+            # Encode the new version now rather than on the next listing
+            product_json(product)
         return product
+    
+    def import_products(self, stream: BinaryIO, fmt: str) -> ProductImportReport:
+        """Bulk-load products from a CSV/NDJSON stream.
+        
+        Rows are validated against ProductCreate and written in batches, one
+        executemany and one commit per batch. Rows with a SKU are upserted on it;
+        rows without one are inserted. Memory stays bounded by the batch size
+        and the capped error list.
+        """
+        report = ProductImportReport(rows=0, imported=0, error_count=0, errors=[])
+        batch = []
+        try:
+            for line, row in iter_rows(stream, fmt):
+                report.rows += 1
+                try:
+                    if isinstance(row, Exception):
+                        raise row
+                    if not isinstance(row, dict):
+                        raise ValueError("Expected an object per line")
+                    batch.append(ProductCreate.model_validate(row))
+                except ValidationError as e:
+                    self._import_error(report, line, [
+                        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()
+                    ])
+                except ValueError as e:
+                    self._import_error(report, line, [str(e)])
+                if len(batch) >= settings.import_batch_size:
+                    report.imported += self._write_import_batch(batch)
+                    batch = []
+            if batch:
+                report.imported += self._write_import_batch(batch)
+        finally:
+            # Even when the import fails part-way, the batches it committed are live
+            if report.imported:
+                self._finish_import()
+        return report
+    
+    def _finish_import(self):
+        """Refresh planner statistics and invalidate the catalog after committed import batches"""
+        # Discard whatever a failed batch left pending; committed batches are unaffected
+        self.db.rollback()
+        # A large import can change the data distribution the planner relies on
+        refresh_statistics(self.db.get_bind())
+        version = invalidation_bus.publish(self.db, CATALOG_CHANNEL, json.dumps(None))
+        self.db.commit()
+        invalidate_catalog(version=version)
+    
+    def list_all_products(self, after_id: int = 0, limit: int = 100) -> List[Product]:
+        """One page of the whole table by id, inactive products included; uncached, for admins"""
+        return self.db.query(Product).filter(Product.id > after_id).order_by(Product.id).limit(limit).all()
+    
+    def export_products(self, columns: List[str], updated_since: Optional[datetime] = None) -> Iterator[list]:
+        """Stream the whole catalog, inactive products included, as batches of row tuples.
+        
+        Rows are fetched yield_per at a time, so memory stays flat however large
+        the table is. Rows never updated since the column was added count as
+        updated when they were created.
+        """
+        query = select(*(Product.__table__.c[name] for name in columns)).order_by(Product.id)
+        if updated_since is not None:
+            if updated_since.tzinfo is not None:
+                # Timestamps are stored as naive UTC
+                updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+            stamp = func.coalesce(Product.updated_at, Product.created_at)
+            since = updated_since.replace(microsecond=0)
+            if self.db.get_bind().dialect.name == "sqlite":
+                # SQLite keeps second-resolution text; normalize both sides before comparing
+                stamp, since = func.datetime(stamp), func.datetime(since)
+            query = query.where(stamp >= since)
+        result = self.db.execute(query.execution_options(yield_per=settings.export_batch_size))
+        yield from result.partitions()
+    
+    def cache_stats(self) -> dict:
+        """Catalog cache hit/miss counters"""
+        return catalog_cache.stats()
+    
+    def _write_import_batch(self, batch: List[ProductCreate]) -> int:
+        """Write one validated batch in a single transaction"""
+        by_sku: Dict[str, dict] = {}
+        new_rows = []
+        for product in batch:
+            if product.sku:
+                # Last row wins for a SKU repeated within the batch; PostgreSQL
+                # rejects an upsert that touches the same row twice
+                by_sku[product.sku] = product.model_dump(exclude_unset=True)
+            else:
+                new_rows.append(product.model_dump())
+        
+        # Upserts only overwrite the columns a row actually set, so group rows by
+        # column set to keep one executemany per shape
+        shapes: Dict[frozenset, List[dict]] = {}
+        for row in by_sku.values():
+            shapes.setdefault(frozenset(row), []).append(row)
+        
+        dialect_name = self.db.get_bind().dialect.name
+        for columns, rows in shapes.items():
+            stmt = upsert(
+                dialect_name, Product.__table__, ["sku"], sorted(columns - {"sku"}),
+                extra_set={"updated_at": func.now(), "version": Product.__table__.c.version + 1}
+            )
+            self.db.execute(stmt, rows)
+        if new_rows:
+            self.db.execute(insert(Product), new_rows)
+        self.db.commit()
+        return len(by_sku) + len(new_rows)
+    
+    def _import_error(self, report: ProductImportReport, line: int, errors: List[str]):
+        report.error_count += 1
+        if len(report.errors) < settings.import_max_errors:
+            report.errors.append(ImportRowError(line=line, errors=errors))
+    
+    def _detach(self, products: List[Product]) -> List[Product]:
+        """Expunge loaded rows so cached instances outlive this session"""
+        for product in products:
+            if product in self.db:
+                self.db.expunge(product)
+        return products
+    
+    def _invalidation_tags(self, product_id: int, affected_categories: Set[str], featured: bool, categories: bool) -> list:
+        """Tags of the cache entries touched by a write to one product"""
+        tags = [product_tag(product_id), COUNTS_TAG]
+        tags.extend(category_tag(category) for category in affected_categories)
+        if featured:
+            tags.append(FEATURED_TAG)
+        if categories:
+            tags.append(CATEGORIES_TAG)
+        return tags
+
+class AsyncProductService:
+    """ProductService for async handlers.
+    
+    Each call runs the sync service logic through AsyncSession.run_sync, so
+    queries go through the async driver and never block the event loop, while
+    filtering, caching and invalidation stay in one place.
+    """
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def get_products_paginated(
+        self,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        page: int = 1,
+        per_page: int = 12,
+        sort: Optional[str] = None,
+        facets: FacetFilter = NO_FACETS
+    ) -> Tuple[List[Product], int]:
+        """Get paginated products with optional filtering"""
+        return await self.db.run_sync(
+            lambda session: ProductService(session).get_products_paginated(
+                category=category, search=search, page=page, per_page=per_page, sort=sort, facets=facets
+            )
+        )
+    
+    async def get_products_after(
+        self,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        cursor: Optional[str] = None,
+        per_page: int = 12,
+        sort: Optional[str] = None,
+        facets: FacetFilter = NO_FACETS
+    ) -> Tuple[List[Product], Optional[str]]:
+        """Get a page of products by seeking past the cursor on (sort_key, id)"""
+        return await self.db.run_sync(
+            lambda session: ProductService(session).get_products_after(
+                category=category, search=search, cursor=cursor, per_page=per_page, sort=sort, facets=facets
+            )
+        )
+    
+    async def count_products(
+        self,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        facets: FacetFilter = NO_FACETS
+    ) -> int:
+        """Count active products matching the filters"""
+        return await self.db.run_sync(
+            lambda session: ProductService(session).count_products(category=category, search=search, facets=facets)
+        )
+    
+    async def get_facet_counts(
+        self,
+        category: Optional[str] = None,
+        search: Optional[str] = None,
+        facets: FacetFilter = NO_FACETS
+    ) -> Dict[str, List[Tuple[str, int]]]:
+        """Per-facet (value, count) pairs for a listing"""
+        return await self.db.run_sync(
+            lambda session: ProductService(session).get_facet_counts(category=category, search=search, facets=facets)
+        )
+    
+    async def list_all_products(self, after_id: int = 0, limit: int = 100) -> List[Product]:
+        """One page of the whole table by id, inactive products included"""
+        return await self.db.run_sync(lambda session: ProductService(session).list_all_products(after_id, limit))
+    
+    async def get_featured_products(self, limit: int = 8) -> List[Product]:
+        """Get featured products"""
+        return await self.db.run_sync(lambda session: ProductService(session).get_featured_products(limit))
+    
+    async def get_product_by_id(self, product_id: int) -> Optional[Product]:
+        """Get product by ID"""
+        return await self.db.run_sync(lambda session: ProductService(session).get_product_by_id(product_id))
+    
+    async def get_related_products(self, category: str, exclude_id: int, limit: int = 4) -> List[Product]:
+        """Get related products by category"""
+        return await self.db.run_sync(
+            lambda session: ProductService(session).get_related_products(category, exclude_id, limit)
+        )
+    
+    async def get_categories(self) -> List[str]:
+        """Get all product categories"""
+        return await self.db.run_sync(lambda session: ProductService(session).get_categories())
+    
+    async def create_product(self, product_data: ProductCreate) -> Product:
+        """Create new product"""
+        return await self.db.run_sync(lambda session: ProductService(session).create_product(product_data))
+    
+    async def update_product(self, product_id: int, product_data: dict) -> Optional[Product]:
+        """Update product"""
+        return await self.db.run_sync(
+            lambda session: ProductService(session).update_product(product_id, product_data)
+        )
+    
+    def cache_stats(self) -> dict:
+        """Catalog cache hit/miss counters"""
+        return catalog_cache.stats()
+
+# Carts are keyed by a random id carried in a signed cookie
+CART_COOKIE = "cart_id"
+_cart_signer = Signer(settings.secret_key, salt="cart")
+
+def get_cart_id(request) -> Optional[str]:
+    """Cart id from the signed session cookie, or None if absent or tampered with"""
+    value = request.cookies.get(CART_COOKIE)
+    if not value:
+        return None
+    try:
+        return _cart_signer.unsign(value).decode()
+    except BadSignature:
+        return None
+
+def new_cart_id() -> str:
+    return secrets.token_urlsafe(16)
+
+def set_cart_cookie(response, cart_id: str):
+    """Issue (or refresh) the signed cart cookie"""
+    response.set_cookie(
+        CART_COOKIE,
+        _cart_signer.sign(cart_id).decode(),
+        max_age=settings.cart_ttl_seconds,
+        httponly=True,
+        samesite="lax"
+    )
+
+# Hot carts as {product_id: quantity} in insertion order. SQLite holds the
+# durable copy; memory entries expire no later than the cart row does.
+cart_memory = TaggedCache(settings.cart_memory_size, settings.cart_ttl_seconds)
+# Another worker changed the cart; reload it from the database next time
+invalidation_bus.subscribe(CART_CHANNEL, cart_memory.invalidate)
 
 class CartService:
     def __init__(self, db: Session):
         self.db = db
     
     def get_session_cart(self, request) -> List[dict]:
-        """Get cart items from session (simplified for demo)"""
-        # In a real app, you'd use proper session management
-        # For demo purposes, returning empty cart
-        return []
+        """Get priced cart items for the request's cart cookie"""
+        cart_id = get_cart_id(request)
+        if not cart_id:
+            return []
+        return self.get_cart(cart_id)
     
-    def add_to_cart(self, request, product_id: int, quantity: int = 1):
-        """Add item to cart"""
-        # Simplified cart management for demo
-        product = self.db.query(Product).filter(Product.id == product_id).first()
-        if not product:
+    def get_cart(self, cart_id: str) -> List[dict]:
+        """Get cart items priced with a single query over all lines"""
+        lines = self._load(cart_id)
+        if not lines:
+            return []
+        
+        rows = self.db.query(
+            Product.id, Product.name, Product.category, Product.size, Product.image_url, Product.price
+        ).filter(
+            and_(Product.id.in_(list(lines)), Product.is_active == True)
+        ).all()
+        by_id = {row.id: row for row in rows}
+        
+        cart_items = []
+        for product_id, quantity in lines.items():
+            row = by_id.get(product_id)
+            if row is None:
+                # Product was deactivated after it was added
+                continue
+            cart_items.append({
+                "id": row.id,
+                "product_id": row.id,
+                "name": row.name,
+                "category": row.category,
+                "size": row.size,
+                "image_url": row.image_url,
+                "price": row.price,
+                "quantity": quantity,
+            })
+        return cart_items
+    
+    def add_to_cart(self, cart_id: str, product_id: int, quantity: int = 1) -> bool:
+        """Add quantity (negative to decrease) of a product to the cart"""
+        if ProductService(self.db).get_product_by_id(product_id) is None:
             return False
         
-        # In a real app, you'd store this in session or database
+        self._touch(cart_id)
+        dialect = self.db.get_bind().dialect.name
+        cart_lines = CartLine.__table__
+        # Applied as a delta in SQL, so concurrent adds to one cart all count
+        new_quantity = self.db.execute(
+            upsert(dialect, cart_lines, ["cart_id", "product_id"], [],
+                   extra_set={"quantity": cart_lines.c.quantity + quantity})
+            .returning(cart_lines.c.quantity),
+            {"cart_id": cart_id, "product_id": product_id, "quantity": quantity}
+        ).scalar()
+        inventory = InventoryService(self.db)
+        if new_quantity <= 0:
+            self.db.execute(
+                delete(CartLine).where(and_(CartLine.cart_id == cart_id, CartLine.product_id == product_id))
+            )
+            inventory.release(cart_id, product_id)
+        elif quantity > 0:
+            try:
+                inventory.hold(cart_id, product_id, quantity)
+            except InsufficientStock:
+                self.db.rollback()
+                raise
+        else:
+            inventory.release(cart_id, product_id, -quantity)
+        invalidation_bus.publish(self.db, CART_CHANNEL, cart_id)
+        inventory.publish_changes()
+        self.db.commit()
+        inventory.invalidate_changes()
+        
+        lines = cart_memory.get(cart_id)
+        if lines is not MISS:
+            if new_quantity > 0:
+                lines[product_id] = new_quantity
+            else:
+                lines.pop(product_id, None)
         return True
     
-    def remove_from_cart(self, request, product_id: int):
+    def remove_from_cart(self, cart_id: str, product_id: int) -> bool:
         """Remove item from cart"""
-        # Simplified for demo
+        lines = self._load(cart_id)
+        self._touch(cart_id)
+        self.db.execute(
+            delete(CartLine).where(and_(CartLine.cart_id == cart_id, CartLine.product_id == product_id))
+        )
+        inventory = InventoryService(self.db)
+        inventory.release(cart_id, product_id)
+        invalidation_bus.publish(self.db, CART_CHANNEL, cart_id)
+        inventory.publish_changes()
+        self.db.commit()
+        inventory.invalidate_changes()
+        lines.pop(product_id, None)
         return True
     
-    def clear_cart(self, request):
+    def clear_cart(self, cart_id: str) -> bool:
+        """Clear all items from cart"""
+        inventory = InventoryService(self.db)
+        inventory.release(cart_id)
+        self.db.execute(delete(CartLine).where(CartLine.cart_id == cart_id))
+        self.db.execute(delete(Cart).where(Cart.id == cart_id))
+        invalidation_bus.publish(self.db, CART_CHANNEL, cart_id)
+        inventory.publish_changes()
+        self.db.commit()
+        inventory.invalidate_changes()
+        cart_memory.invalidate(cart_id)
+        return True
+    
+    def hold_for_checkout(self, cart_id: str) -> List[int]:
+        """Renew the cart's stock holds as checkout starts; returns ids of products that can't be held in full"""
+        lines = self._load(cart_id)
+        if not lines:
+            return []
+        inventory = InventoryService(self.db)
+        short = inventory.renew(cart_id, lines)
+        inventory.publish_changes()
+        self.db.commit()
+        inventory.invalidate_changes()
+        return short
+    
+    def sweep_expired(self) -> int:
+        """Delete abandoned carts past their TTL; returns how many were removed"""
+        expired = select(Cart.id).where(Cart.expires_at < datetime.utcnow())
+        cart_ids = [row[0] for row in self.db.execute(expired)]
+        if not cart_ids:
+            return 0
+        self.db.execute(delete(CartLine).where(CartLine.cart_id.in_(cart_ids)))
+        self.db.execute(delete(Cart).where(Cart.id.in_(cart_ids)))
+        self.db.commit()
+        for cart_id in cart_ids:
+            cart_memory.invalidate(cart_id)
+        return len(cart_ids)
+    
+    def _load(self, cart_id: str) -> Dict[int, int]:
+        """Cart lines from memory, falling back to SQLite"""
+        lines = cart_memory.get(cart_id)
+        if lines is not MISS:
+            return lines
+        
+        rows = self.db.query(CartLine.product_id, CartLine.quantity).join(Cart).filter(
+            and_(Cart.id == cart_id, Cart.expires_at >= datetime.utcnow())
+        ).all()
+        lines = {row.product_id: row.quantity for row in rows}
+        cart_memory.set(cart_id, lines)
+        return lines
+    
+    def _touch(self, cart_id: str):
+        """Create the cart row or push its expiry out"""
+        dialect = self.db.get_bind().dialect.name
+        self.db.execute(
+            upsert(dialect, Cart.__table__, ["id"], ["expires_at"]),
+            {"id": cart_id, "expires_at": datetime.utcnow() + timedelta(seconds=settings.cart_ttl_seconds)}
+        )
+
+class AsyncCartService:
+    """CartService for async handlers"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def get_session_cart(self, request) -> List[dict]:
+        """Get priced cart items for the request's cart cookie"""
+        return await self.db.run_sync(lambda session: CartService(session).get_session_cart(request))
+    
+    async def get_cart(self, cart_id: str) -> List[dict]:
+        """Get cart items priced with a single query over all lines"""
+        return await self.db.run_sync(lambda session: CartService(session).get_cart(cart_id))
+    
+    async def add_to_cart(self, cart_id: str, product_id: int, quantity: int = 1) -> bool:
+        """Add item to cart"""
+        return await self.db.run_sync(lambda session: CartService(session).add_to_cart(cart_id, product_id, quantity))
+    
+    async def remove_from_cart(self, cart_id: str, product_id: int) -> bool:
+        """Remove item from cart"""
+        return await self.db.run_sync(lambda session: CartService(session).remove_from_cart(cart_id, product_id))
+    
+    async def clear_cart(self, cart_id: str) -> bool:
         """Clear all items from cart"""
-        # Simplified for demo
+        return await self.db.run_sync(lambda session: CartService(session).clear_cart(cart_id))
+    
+    async def hold_for_checkout(self, cart_id: str) -> List[int]:
+        """Renew the cart's stock holds as checkout starts"""
+        return await self.db.run_sync(lambda session: CartService(session).hold_for_checkout(cart_id))
+    
+    async def sweep_expired(self) -> int:
+        """Delete abandoned carts past their TTL"""
+        return await self.db.run_sync(lambda session: CartService(session).sweep_expired())
+
+class InsufficientStock(ValueError):
+    """Raised when a product hasn't enough unreserved stock for a hold or sale"""
+    
+    def __init__(self, product_id: int, available: int):
+        super().__init__(f"Only {max(available, 0)} left of product {product_id}")
+        self.product_id = product_id
+        self.available = available
+
+class InventoryService:
+    """Time-limited stock holds for carts, converted to sales at checkout.
+    
+    products.reserved_quantity always equals the sum of the product's
+    inventory_holds rows, expired or not, until those are reclaimed. Every
+    stock change is one conditional UPDATE of the product row, never a read
+    followed by a write, so concurrent buyers of a hot SKU can't oversell it:
+    the UPDATE that would take it below zero matches no row. Callers commit,
+    keeping the row lock (SQLite's write lock) to a few statements, and
+    bracket the commit with publish_changes()/invalidate_changes() so pages
+    showing the stock are refreshed.
+    """
+    
+    def __init__(self, db: Session):
+        self.db = db
+        # Products whose on-hand or reserved stock this unit of work changed
+        self.changed: Set[int] = set()
+        self._version: Optional[int] = None
+    
+    def publish_changes(self):
+        """Queue the stock invalidation for other workers in the caller's transaction"""
+        if self.changed:
+            self._version = invalidation_bus.publish(self.db, STOCK_CHANNEL, json.dumps(sorted(self.changed)))
+    
+    def invalidate_changes(self):
+        """After commit: drop this worker's cached views of the changed stock"""
+        invalidate_stock(self.changed, self._version)
+        self.changed = set()
+        self._version = None
+    
+    def available(self, product_id: int) -> int:
+        """Stock not held by any cart"""
+        return self.db.execute(
+            select(Product.stock_quantity - Product.reserved_quantity).where(Product.id == product_id)
+        ).scalar() or 0
+    
+    def hold(self, cart_id: str, product_id: int, quantity: int):
+        """Hold quantity more of a product for the cart and renew its expiry, or raise InsufficientStock"""
+        if not self._reserve(product_id, quantity):
+            # Expired holds count as reserved until swept; reclaim this product's and try again
+            if not self.reclaim_expired(product_id) or not self._reserve(product_id, quantity):
+                raise InsufficientStock(product_id, self.available(product_id))
+        holds = InventoryHold.__table__
+        self.db.execute(
+            upsert(self.db.get_bind().dialect.name, holds, ["cart_id", "product_id"], ["expires_at"],
+                   extra_set={"quantity": holds.c.quantity + quantity}),
+            {"cart_id": cart_id, "product_id": product_id, "quantity": quantity, "expires_at": self._expiry()}
+        )
+    
+    def release(self, cart_id: str, product_id: Optional[int] = None, quantity: Optional[int] = None):
+        """Give back up to quantity of the cart's hold on a product; all of it, or of every product, when omitted"""
+        holds = InventoryHold.__table__
+        if product_id is not None and quantity is not None:
+            held = self.db.execute(
+                select(holds.c.quantity).where(and_(holds.c.cart_id == cart_id, holds.c.product_id == product_id))
+            ).scalar() or 0
+            if quantity < held:
+                self.db.execute(
+                    update(holds).where(and_(holds.c.cart_id == cart_id, holds.c.product_id == product_id))
+                    .values(quantity=holds.c.quantity - quantity)
+                )
+                self._unreserve({product_id: quantity})
+                return
+        
+        stmt = delete(holds).where(holds.c.cart_id == cart_id)
+        if product_id is not None:
+            stmt = stmt.where(holds.c.product_id == product_id)
+        self._unreserve(self._delete_holds(stmt))
+    
+    def renew(self, cart_id: str, lines: Dict[int, int]) -> List[int]:
+        """Hold every cart line in full for another hold period; returns ids of products that fell short"""
+        holds = InventoryHold.__table__
+        held = dict(self.db.execute(
+            select(holds.c.product_id, holds.c.quantity).where(holds.c.cart_id == cart_id)
+        ).all())
+        short = []
+        for product_id, quantity in sorted(lines.items()):
+            missing = quantity - held.get(product_id, 0)
+            if missing <= 0:
+                continue
+            try:
+                self.hold(cart_id, product_id, missing)
+            except InsufficientStock:
+                short.append(product_id)
+        self.db.execute(update(holds).where(holds.c.cart_id == cart_id).values(expires_at=self._expiry()))
+        return short
+    
+    def convert(self, cart_id: Optional[str], quantities: Dict[int, int]):
+        """Take an order's quantities off stock, consuming the cart's holds.
+        
+        Quantities beyond what the cart holds are sold from unreserved stock,
+        or InsufficientStock is raised.
+        """
+        products = Product.__table__
+        held: Dict[int, int] = {}
+        if cart_id:
+            held = self._delete_holds(delete(InventoryHold.__table__).where(InventoryHold.cart_id == cart_id))
+        
+        # Sorted, so concurrent orders lock shared product rows in the same order
+        for product_id, quantity in sorted(quantities.items()):
+            released = held.pop(product_id, 0)
+            result = self.db.execute(
+                update(products)
+                .where(and_(
+                    products.c.id == product_id,
+                    products.c.stock_quantity - products.c.reserved_quantity + released >= quantity
+                ))
+                .values(
+                    stock_quantity=products.c.stock_quantity - quantity,
+                    reserved_quantity=products.c.reserved_quantity - released,
+                    version=products.c.version + 1
+                )
+            )
+            if result.rowcount != 1:
+                raise InsufficientStock(product_id, self.available(product_id) + released)
+            self.changed.add(product_id)
+        # Held but no longer ordered
+        self._unreserve(held)
+    
+    def reclaim_expired(self, product_id: Optional[int] = None) -> int:
+        """Release holds past their expiry, of one product or all; returns how many units went back on sale"""
+        holds = InventoryHold.__table__
+        stmt = delete(holds).where(holds.c.expires_at < datetime.utcnow())
+        if product_id is not None:
+            stmt = stmt.where(holds.c.product_id == product_id)
+        released = self._delete_holds(stmt)
+        self._unreserve(released)
+        return sum(released.values())
+    
+    def sweep_expired(self) -> int:
+        """Reclaim every expired hold and commit"""
+        released = self.reclaim_expired()
+        self.publish_changes()
+        self.db.commit()
+        self.invalidate_changes()
+        return released
+    
+    def _reserve(self, product_id: int, quantity: int) -> bool:
+        products = Product.__table__
+        result = self.db.execute(
+            update(products)
+            .where(and_(
+                products.c.id == product_id,
+                products.c.is_active == True,
+                products.c.stock_quantity - products.c.reserved_quantity >= quantity
+            ))
+            .values(reserved_quantity=products.c.reserved_quantity + quantity)
+        )
+        if result.rowcount != 1:
+            return False
+        self.changed.add(product_id)
         return True
+    
+    def _delete_holds(self, stmt) -> Dict[int, int]:
+        """Run a DELETE on inventory_holds; RETURNING hands each row to exactly one concurrent deleter"""
+        holds = InventoryHold.__table__
+        released: Dict[int, int] = {}
+        for product_id, quantity in self.db.execute(stmt.returning(holds.c.product_id, holds.c.quantity)):
+            released[product_id] = released.get(product_id, 0) + quantity
+        return released
+    
+    def _unreserve(self, released: Dict[int, int]):
+        products = Product.__table__
+        for product_id, quantity in sorted(released.items()):
+            self.db.execute(
+                update(products).where(products.c.id == product_id)
+                .values(reserved_quantity=products.c.reserved_quantity - quantity)
+            )
+            self.changed.add(product_id)
+    
+    def _expiry(self) -> datetime:
+        return datetime.utcnow() + timedelta(seconds=settings.inventory_hold_seconds)
+
+class AsyncInventoryService:
+    """InventoryService for async handlers"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def sweep_expired(self) -> int:
+        """Reclaim every expired hold"""
+        return await self.db.run_sync(lambda session: InventoryService(session).sweep_expired())
+
+def _decode_neighbors(neighbors: str) -> Dict[int, int]:
+    """Parse "12:9,7:4" into {12: 9, 7: 4}"""
+    if not neighbors:
+        return {}
+    return {int(other_id): int(orders) for other_id, orders in (pair.split(":") for pair in neighbors.split(","))}
+
+def _encode_neighbors(counts: Dict[int, int], top_k: int) -> str:
+    """Keep the top_k partners by order count (ties to the lower id) in compact form"""
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:top_k]
+    return ",".join(f"{other_id}:{orders}" for other_id, orders in ranked)
+
+class RecommendationService:
+    """Co-purchase ("bought together") index over order history.
+    
+    product_copurchases counts, per ordered pair of products, the orders that
+    contained both; product_recommendations keeps each product's top-K of those
+    as one compact row, so reads never touch order history. Pair counts only
+    grow, so merging an order's new counts into the stored top-K lists keeps
+    them exact without rescanning a product's partners.
+    """
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def neighbors(self, product_id: int) -> List[int]:
+        """Co-purchased product ids, most often bought together first"""
+        neighbors = self.db.execute(
+            select(ProductRecommendation.neighbors).where(ProductRecommendation.product_id == product_id)
+        ).scalar()
+        return list(_decode_neighbors(neighbors or ""))
+    
+    def record_order(self, product_ids: List[int]):
+        """Count an order's product pairs and update their top-K lists; the caller commits"""
+        ids = sorted(set(product_ids))
+        if len(ids) < 2:
+            return
+        dialect = self.db.get_bind().dialect.name
+        pairs = ProductCopurchase.__table__
+        self.db.execute(
+            upsert(dialect, pairs, ["product_id", "other_id"], [], extra_set={"orders": pairs.c.orders + 1}),
+            [{"product_id": a, "other_id": b, "orders": 1} for a in ids for b in ids if a != b]
+        )
+        
+        stored = dict(self.db.execute(
+            select(ProductRecommendation.product_id, ProductRecommendation.neighbors)
+            .where(ProductRecommendation.product_id.in_(ids))
+        ).all())
+        counts = {product_id: _decode_neighbors(stored.get(product_id, "")) for product_id in ids}
+        for product_id, other_id, orders in self.db.execute(
+            select(pairs.c.product_id, pairs.c.other_id, pairs.c.orders)
+            .where(and_(pairs.c.product_id.in_(ids), pairs.c.other_id.in_(ids)))
+        ):
+            counts[product_id][other_id] = orders
+        self.db.execute(
+            upsert(dialect, ProductRecommendation.__table__, ["product_id"], ["neighbors"]),
+            [
+                {"product_id": product_id, "neighbors": _encode_neighbors(partners, settings.recommendation_top_k)}
+                for product_id, partners in counts.items()
+            ]
+        )
+    
+    def rebuild(self) -> int:
+        """Recompute the whole index from order history; returns how many products have recommendations"""
+        pairs = ProductCopurchase.__table__
+        a, b = OrderItem.__table__.alias("a"), OrderItem.__table__.alias("b")
+        self.db.execute(delete(ProductRecommendation))
+        self.db.execute(delete(ProductCopurchase))
+        self.db.execute(insert(ProductCopurchase).from_select(
+            ["product_id", "other_id", "orders"],
+            select(a.c.product_id, b.c.product_id, func.count(func.distinct(a.c.order_id)))
+            .select_from(a.join(b, and_(a.c.order_id == b.c.order_id, a.c.product_id != b.c.product_id)))
+            .group_by(a.c.product_id, b.c.product_id)
+        ))
+        
+        rank = func.row_number().over(
+            partition_by=pairs.c.product_id, order_by=(pairs.c.orders.desc(), pairs.c.other_id)
+        ).label("rank")
+        ranked = select(pairs.c.product_id, pairs.c.other_id, pairs.c.orders, rank).subquery()
+        rows = self.db.execute(
+            select(ranked.c.product_id, ranked.c.other_id, ranked.c.orders)
+            .where(ranked.c.rank <= settings.recommendation_top_k)
+            .order_by(ranked.c.product_id, ranked.c.rank)
+        )
+        lists: Dict[int, Dict[int, int]] = {}
+        for product_id, other_id, orders in rows:
+            lists.setdefault(product_id, {})[other_id] = orders
+        if lists:
+            self.db.execute(insert(ProductRecommendation), [
+                {"product_id": product_id, "neighbors": _encode_neighbors(partners, settings.recommendation_top_k)}
+                for product_id, partners in lists.items()
+            ])
+        self.db.commit()
+        return len(lists)
+
+# Order lines plus a product summary; selectin keeps it to one extra query per page
+ORDER_DETAIL = selectinload(Order.items).joinedload(OrderItem.product).load_only(
+    Product.id, Product.name, Product.image_url
+)
 
 class OrderService:
     def __init__(self, db: Session):
         self.db = db
     
-    def create_order(self, user_id: int, cart_items: List[dict], order_data: dict) -> Order:
-        """Create new order"""
-        total_amount = sum(item['price'] * item['quantity'] for item in cart_items)
+    def create_order(
+        self,
+        user_id: int,
+        cart_items: List[dict],
+        order_data: dict,
+        idempotency_key: Optional[str] = None,
+        cart_id: Optional[str] = None
+    ) -> Order:
+        """Create new order in a single transaction.
+        
+        Line prices and the total are recomputed from current product prices;
+        client-supplied prices are ignored. Stock comes off the cart's holds
+        (cart_id), topped up from unreserved stock. Retrying with the same
+        idempotency key returns the original order instead of creating another,
+        whatever the cart holds by then; the key's primary key still settles
+        concurrent duplicates.
+        """
+        if idempotency_key:
+            # Checked before the cart: a successful first attempt has already emptied it
+            existing = self._order_for_key(user_id, idempotency_key)
+            if existing is not None:
+                return existing
+        
+        quantities: Dict[int, int] = {}
+        for item in cart_items:
+            if item['quantity'] <= 0:
+                raise ValueError("Item quantities must be positive")
+            quantities[item['product_id']] = quantities.get(item['product_id'], 0) + item['quantity']
+        if not quantities:
+            raise ValueError("Cannot create an order without items")
+        
+        prices = dict(
+            self.db.query(Product.id, Product.price).filter(
+                and_(Product.id.in_(list(quantities)), Product.is_active == True)
+            ).all()
+        )
+        missing = set(quantities) - set(prices)
+        if missing:
+            raise ValueError(f"Products no longer available: {sorted(missing)}")
+        
+        total_amount = round(sum(prices[pid] * qty for pid, qty in quantities.items()), 2)
         
         order = Order(
             order_number=generate_order_number(),
@@ -131,30 +1315,93 @@ class OrderService:
             payment_method=order_data['payment_method']
         )
         
-        self.db.add(order)
-        self.db.commit()
-        self.db.refresh(order)
-        
-        # Add order items
-        for item in cart_items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=item['product_id'],
-                quantity=item['quantity'],
-                price=item['price']
+        try:
+            self.db.add(order)
+            self.db.flush()
+            
+            # One executemany for all lines
+            self.db.execute(
+                insert(OrderItem),
+                [
+                    {"order_id": order.id, "product_id": pid, "quantity": qty, "price": prices[pid]}
+                    for pid, qty in quantities.items()
+                ]
             )
-            self.db.add(order_item)
+            if idempotency_key:
+                # The (user_id, key) primary key rejects a second order for the same key
+                self.db.execute(
+                    insert(OrderIdempotencyKey),
+                    {"user_id": user_id, "key": idempotency_key, "order_id": order.id}
+                )
+            RecommendationService(self.db).record_order(list(quantities))
+            # Last, so the hot product rows stay locked only until the commit
+            inventory = InventoryService(self.db)
+            inventory.convert(cart_id, quantities)
+            inventory.publish_changes()
+            
+            self.db.commit()
+        except (IntegrityError, InsufficientStock):
+            self.db.rollback()
+            # Retry of an earlier checkout (or a concurrent duplicate): hand back the original
+            if idempotency_key:
+                existing = self._order_for_key(user_id, idempotency_key)
+                if existing is not None:
+                    return existing
+            raise
         
-        self.db.commit()
+        inventory.invalidate_changes()
         return order
     
-    def get_user_orders(self, user_id: int) -> List[Order]:
-        """Get all orders for a user"""
-        return self.db.query(Order).filter(Order.user_id == user_id).all()
+    def _order_for_key(self, user_id: int, idempotency_key: str) -> Optional[Order]:
+        return self.db.query(Order).join(
+            OrderIdempotencyKey, OrderIdempotencyKey.order_id == Order.id
+        ).filter(
+            and_(OrderIdempotencyKey.user_id == user_id, OrderIdempotencyKey.key == idempotency_key)
+        ).first()
+    
+    def get_user_orders(self, user_id: int, page: int = 1, per_page: int = 20) -> Tuple[List[Order], bool]:
+        """Get a page of a user's orders, newest first; returns (orders, has_next).
+        
+        Items and their product summaries are loaded up front, so a page costs
+        two queries regardless of how many orders or lines it holds.
+        """
+        orders = self.db.query(Order).options(ORDER_DETAIL).filter(
+            Order.user_id == user_id
+        ).order_by(Order.id.desc()).offset((page - 1) * per_page).limit(per_page + 1).all()
+        return orders[:per_page], len(orders) > per_page
     
     def get_order_by_id(self, order_id: int) -> Optional[Order]:
         """Get order by ID"""
-        return self.db.query(Order).filter(Order.id == order_id).first()
+        return self.db.query(Order).options(ORDER_DETAIL).filter(Order.id == order_id).first()
+
+class AsyncOrderService:
+    """OrderService for async handlers"""
+    
+    def __init__(self, db: AsyncSession):
+        self.db = db
+    
+    async def create_order(
+        self,
+        user_id: int,
+        cart_items: List[dict],
+        order_data: dict,
+        idempotency_key: Optional[str] = None,
+        cart_id: Optional[str] = None
+    ) -> Order:
+        """Create new order in a single transaction"""
+        return await self.db.run_sync(
+            lambda session: OrderService(session).create_order(
+                user_id, cart_items, order_data, idempotency_key, cart_id
+            )
+        )
+    
+    async def get_user_orders(self, user_id: int, page: int = 1, per_page: int = 20) -> Tuple[List[Order], bool]:
+        """Get a page of a user's orders, newest first"""
+        return await self.db.run_sync(lambda session: OrderService(session).get_user_orders(user_id, page, per_page))
+    
+    async def get_order_by_id(self, order_id: int) -> Optional[Order]:
+        """Get order by ID"""
+        return await self.db.run_sync(lambda session: OrderService(session).get_order_by_id(order_id))
 
 def init_sample_data(db: Session):
     """Initialize sample data"""
@@ -0,0 +1,157 @@
+"""Cross-worker cache invalidation.
+
+Each worker process keeps its own in-memory caches. With several workers,
+a write that invalidates local entries also appends a row to
+invalidation_log in the same transaction. Every worker replays rows it
+didn't write before serving its next request. On SQLite, PRAGMA
+data_version on a dedicated connection cheaply shows whether anyone else
+has committed, so the log is only read after such a commit. Server
+databases poll the log at most every settings.invalidation_poll_seconds.
+"""
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.engine import Engine
+from starlette.concurrency import run_in_threadpool
+from starlette.types import ASGIApp, Receive, Scope, Send
+from models.schemas import InvalidationEvent
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+class InvalidationBus:
+    """Publishes local invalidations to, and applies remote ones from, invalidation_log"""
+    
+    def __init__(self, enabled: bool, poll_interval: float):
+        self.enabled = enabled
+        self.poll_interval = poll_interval
+        self._handlers: Dict[str, Callable[[str], None]] = {}
+        self._lock = threading.Lock()
+        self._engine = None
+        self._origin = None
+        self._last_id = 0
+        self._version_conn = None
+        self._data_version = None
+        self._next_poll = 0.0
+    
+    @property
+    def active(self) -> bool:
+        return self._origin is not None
+    
+    @property
+    def last_id(self) -> int:
+        """The newest log id this worker has applied; while a handler runs, the id of its event"""
+        return self._last_id
+    
+    def subscribe(self, channel: str, handler: Callable[[str], None]):
+        """Run handler(payload) for each invalidation another worker publishes on channel"""
+        self._handlers[channel] = handler
+    
+    def start(self, engine: Engine):
+        """Follow the log from its current end; call in each worker, after the fork"""
+        if not self.enabled:
+            return
+        self._engine = engine
+        # Generated here rather than at import so preloaded workers don't share it
+        self._origin = uuid.uuid4().hex
+        with engine.connect() as conn:
+            self._last_id = conn.execute(select(func.max(InvalidationEvent.id))).scalar() or 0
+        if engine.dialect.name == "sqlite":
+            self._version_conn = engine.raw_connection()
+            self._data_version = self._read_data_version()
+    
+    def stop(self):
+        if self._version_conn is not None:
+            self._version_conn.close()
+            self._version_conn = None
+        self._origin = None
+    
+    def publish(self, connection, channel: str, payload: str = "") -> Optional[int]:
+        """Add an invalidation to the caller's transaction (a Session or Connection) and return its log id.
+        
+        A no-op returning None with one worker.
+        """
+        if not self.active:
+            return None
+        return connection.execute(
+            insert(InvalidationEvent.__table__),
+            {"origin": self._origin, "channel": channel, "payload": payload, "created_at": datetime.utcnow()}
+        ).inserted_primary_key[0]
+    
+    def poll(self):
+        """Apply invalidations other workers committed since the last poll; blocking, so async callers run it in a thread"""
+        if not self.active:
+            return
+        with self._lock:
+            if self._version_conn is not None:
+                # Changes whenever another connection commits; reading it touches no table
+                version = self._read_data_version()
+                if version == self._data_version:
+                    return
+                self._data_version = version
+            else:
+                # Interval polling by id assumes ids commit in order, which holds for
+                # SQLite's single writer; under heavy concurrent writes a sequence-backed
+                # server database can commit a lower id later, delaying it to the TTL
+                now = time.monotonic()
+                if now < self._next_poll:
+                    return
+                self._next_poll = now + self.poll_interval
+    
+            with self._engine.connect() as conn:
+                rows = conn.execute(
+                    select(InvalidationEvent.id, InvalidationEvent.origin, InvalidationEvent.channel,
+                           InvalidationEvent.payload)
+                    .where(InvalidationEvent.id > self._last_id)
+                    .order_by(InvalidationEvent.id)
+                ).all()
+            for row in rows:
+                self._last_id = row.id
+                handler = self._handlers.get(row.channel)
+                if row.origin == self._origin or handler is None:
+                    continue
+                try:
+                    handler(row.payload)
+                except Exception:
+                    logger.exception("Applying %s invalidation failed", row.channel)
+    
+    def prune(self, max_age_seconds: float) -> int:
+        """Delete log rows every worker has long since applied, always keeping the newest.
+        
+        Its id is where a (re)started worker resumes numbering versions from.
+        """
+        if not self.active:
+            return 0
+        cutoff = datetime.utcnow() - timedelta(seconds=max_age_seconds)
+        newest = select(func.max(InvalidationEvent.id)).scalar_subquery()
+        with self._engine.begin() as conn:
+            return conn.execute(
+                delete(InvalidationEvent).where(InvalidationEvent.created_at < cutoff, InvalidationEvent.id < newest)
+            ).rowcount
+    
+    def _read_data_version(self) -> int:
+        cursor = self._version_conn.cursor()
+        try:
+            cursor.execute("PRAGMA data_version")
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+class InvalidationMiddleware:
+    """Brings this worker's caches up to date before each request"""
+    
+    def __init__(self, app: ASGIApp, bus: InvalidationBus):
+        self.app = app
+        self.bus = bus
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] == "http" and self.bus.active:
+            # poll() does blocking database reads; keep them off the event loop
+            await run_in_threadpool(self.bus.poll)
+        await self.app(scope, receive, send)
+
+invalidation_bus = InvalidationBus(enabled=settings.workers > 1, poll_interval=settings.invalidation_poll_seconds)
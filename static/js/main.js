@@ -52,27 +52,35 @@ function addToCart(productId, quantity = 1) {
         button.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Adding...';
         button.disabled = true;
         
-        // Simulate API call
-        setTimeout(() => {
-            // Add to local cart
-            const existingItem = cart.find(item => item.productId === productId);
-            if (existingItem) {
-                existingItem.quantity += quantity;
-            } else {
-                cart.push({ productId, quantity });
-            }
-            
-            // Save to localStorage
-            localStorage.setItem('cart', JSON.stringify(cart));
-            
-            // Update UI
-            updateCartBadge();
-            showNotification('Product added to cart!', 'success');
-            
-            // Restore button
-            button.innerHTML = originalText;
-            button.disabled = false;
-        }, 500);
+        const body = new FormData();
+        body.append('product_id', productId);
+        body.append('quantity', quantity);
+        
+        fetch('/api/cart/add', { method: 'POST', body })
+            .then(response => {
+                if (!response.ok) {
+                    return response.json().catch(() => ({})).then(data => {
+                        throw new Error(data.detail || 'Could not add product to cart');
+                    });
+                }
+                // Mirror the server cart locally for the navbar badge
+                const existingItem = cart.find(item => item.productId === productId);
+                if (existingItem) {
+                    existingItem.quantity += quantity;
+                } else {
+                    cart.push({ productId, quantity });
+                }
+                localStorage.setItem('cart', JSON.stringify(cart));
+                
+                updateCartBadge();
+                showNotification('Product added to cart!', 'success');
+            })
+            .catch(error => showNotification(error.message, 'danger'))
+            .finally(() => {
+                // Restore button
+                button.innerHTML = originalText;
+                button.disabled = false;
+            });
     }
 }
 
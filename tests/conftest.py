@@ -0,0 +1,29 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Run from a scratch directory: a throwaway database, and no checked-in .env
+# (the app finds static/ and templates/ relative to the working directory)
+os.chdir(tempfile.mkdtemp())
+for name in ("static", "templates"):
+    os.symlink(os.path.join(ROOT, name), name)
+os.environ["DATABASE_URL"] = f"sqlite:///{os.getcwd()}/test.db"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+os.environ["BCRYPT_ROUNDS"] = "4"
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from app.main import app
+    with TestClient(app) as client:
+        yield client
+
+@pytest.fixture(scope="session")
+def admin_headers(client):
+    response = client.post("/auth/login", data={"username": "admin", "password": "admin123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
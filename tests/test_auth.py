@@ -0,0 +1,20 @@
+def test_demotion_is_not_outlived_by_a_principal_read_before_commit(client):
+    from core.database import SessionLocal
+    from models.schemas import User
+    
+    client.post("/auth/register", data={"email": "demoted@example.com", "username": "demoted", "password": "secret123"})
+    db = SessionLocal()
+    user = db.query(User).filter(User.username == "demoted").one()
+    user.is_admin = True
+    db.commit()
+    token = client.post("/auth/login", data={"username": "demoted", "password": "secret123"}).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/admin/products", headers=headers).status_code == 200
+    
+    user.is_admin = False
+    db.flush()
+    # Reads (and caches) the still-committed admin row between the flush and the commit
+    assert client.get("/admin/products", headers=headers).status_code == 200
+    db.commit()
+    db.close()
+    assert client.get("/admin/products", headers=headers).status_code == 403
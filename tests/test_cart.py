@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+
+def test_concurrent_adds_to_one_cart_all_count(client):
+    client.delete("/api/cart/clear")
+    client.post("/api/cart/add", data={"product_id": 1, "quantity": 1})
+    cookies = dict(client.cookies)
+    
+    with ThreadPoolExecutor(max_workers=9) as pool:
+        responses = list(pool.map(
+            lambda _: client.post("/api/cart/add", data={"product_id": 1, "quantity": 1}, cookies=cookies),
+            range(9)
+        ))
+    assert all(response.status_code == 200 for response in responses)
+    
+    from core.database import engine
+    with engine.connect() as conn:
+        held, reserved = conn.exec_driver_sql(
+            "SELECT (SELECT sum(quantity) FROM inventory_holds WHERE product_id = 1), reserved_quantity "
+            "FROM products WHERE id = 1"
+        ).one()
+    items = client.get("/api/cart/").json()["items"]
+    assert [item["quantity"] for item in items] == [10]
+    assert held == reserved == 10
+    client.delete("/api/cart/clear")
+
+def test_hold_revalidates_pages_but_drops_only_those_showing_the_product(client):
+    client.delete("/api/cart/clear")
+    product = client.get("/api/products/2").json()
+    etag = client.get("/product/2").headers["etag"]
+    assert client.get("/product/2", headers={"If-None-Match": etag}).status_code == 304
+    client.get("/products?category=NoSuchCategory")
+    
+    from services.business import page_cache
+    client.post("/api/cart/add", data={"product_id": 2, "quantity": 3})
+    page = client.get("/product/2")
+    assert f"({product['stock_quantity'] - 3} available)" in page.text
+    # The stock shown changed, so the old ETag must no longer validate
+    assert page.headers["etag"] != etag
+    assert client.get("/product/2", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/api/products/2", headers={"If-None-Match": etag}).status_code == 200
+    assert any(key[:2] == ("products", "NoSuchCategory") for key in page_cache._entries)
+    client.delete("/api/cart/clear")
@@ -0,0 +1,42 @@
+from core.cache import VersionStamp
+
+def test_restarted_worker_resumes_version_numbering():
+    from core.database import engine
+    from services.invalidation import InvalidationBus
+    
+    writer = InvalidationBus(enabled=True, poll_interval=0)
+    writer.start(engine)
+    with engine.begin() as conn:
+        event_id = writer.publish(conn, "catalog", "null")
+    stamp = VersionStamp("catalog")
+    stamp.bump(event_id)
+    # Everything is old enough to prune, but the newest row survives
+    writer.prune(-60)
+    writer.stop()
+    
+    # A respawned worker forked from the same preloaded process shares the epoch
+    respawned = InvalidationBus(enabled=True, poll_interval=0)
+    respawned.start(engine)
+    restarted = VersionStamp("catalog")
+    restarted._epoch = stamp._epoch
+    restarted.bump(respawned.last_id)
+    respawned.stop()
+    assert respawned.last_id == event_id
+    # Not back at 0, where it could reissue the ETag of the content before event_id
+    assert restarted.etag == stamp.etag == f'"catalog-{stamp._epoch:x}-{event_id}"'
+
+def test_late_shared_version_does_not_move_the_stamp_back():
+    stamp = VersionStamp("catalog")
+    stamp.bump(12)
+    stamp.bump(11)
+    assert stamp.etag.endswith('-12"')
+
+def test_value_built_across_an_invalidation_is_not_cached():
+    from core.cache import MISS, TaggedCache
+    
+    cache = TaggedCache(max_entries=10, ttl_seconds=60)
+    generation = cache.generation
+    # A write commits and invalidates while the value is being read
+    cache.invalidate_tags(("product", 1))
+    cache.set(("product", 1), "old price", tags=(("product", 1),), generation=generation)
+    assert cache.get(("product", 1)) is MISS
@@ -0,0 +1,28 @@
+ORDER_FORM = {"shipping_address": "1 Test St", "billing_address": "1 Test St", "payment_method": "card"}
+
+def test_checkout_retry_after_success_returns_original_order(client, admin_headers):
+    assert client.post("/api/cart/add", data={"product_id": 2, "quantity": 1}).status_code == 200
+    headers = {**admin_headers, "Idempotency-Key": "retry-after-success"}
+    
+    first = client.post("/api/orders/", data=ORDER_FORM, headers=headers)
+    assert first.status_code == 200
+    # The first attempt cleared the cart
+    assert client.get("/api/cart/").json()["items"] == []
+    
+    retry = client.post("/api/orders/", data=ORDER_FORM, headers=headers)
+    assert retry.status_code == 200
+    assert retry.json()["id"] == first.json()["id"]
+
+def test_checkout_without_key_rejects_empty_cart(client, admin_headers):
+    client.delete("/api/cart/clear")
+    response = client.post("/api/orders/", data=ORDER_FORM, headers=admin_headers)
+    assert response.status_code == 400
+
+def test_sale_invalidates_the_product_etag(client, admin_headers):
+    before = client.get("/api/products/2")
+    assert client.post("/api/cart/add", data={"product_id": 2, "quantity": 2}).status_code == 200
+    assert client.post("/api/orders/", data=ORDER_FORM, headers=admin_headers).status_code == 200
+    
+    after = client.get("/api/products/2", headers={"If-None-Match": before.headers["etag"]})
+    assert after.status_code == 200
+    assert after.json()["stock_quantity"] == before.json()["stock_quantity"] - 2